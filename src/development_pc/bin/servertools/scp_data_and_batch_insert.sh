@@ -6,10 +6,10 @@
 #      ※クライアントPCの公開キーがサーバー側に設定済み
 #  (2)PostgreSQL16デーベースのdockerコンテナが稼働していること
 # [処理手順]
-#  1. scpコマンドでサーバーから不正アクセスログファイルをローカルPCにコピーする
+#  1. scpコマンドでサーバーから日次サマリーファイル (サーバー側で集計済み) をローカルPCにコピーする
+#     ※サーバー側で ssh_auth_error_collector.py --summarize が出力したファイル
 #  2. python仮想環境に入り下記 pythonスクリプトを実行
-#     2-1. 不正アクセスログファイルからデータベース登録用のCSVファイルを出力する
-#     2-2. データベース登録用のCSVファイルをもとに該当するテーブルに一括登録する
+#     日次サマリーファイルから該当するテーブルに一括登録する (CSVファイルも出力する)
 
 
 # 引数は対象日付のみ必須
@@ -26,9 +26,9 @@ if [ -z "$postgres_16" ]; then
    exit 1
 fi   
 
-# サーバーから不正アクセスログファイルをコピー
+# サーバーから日次サマリーファイルをコピー
 log_date=$1
-log_file="AuthFail_ssh_$log_date.log"
+log_file="AuthFail_ssh_$log_date.summary.tsv.gz"
 BASE_DIR="$HOME/Documents/exmaple"
 LOG_DIR="$BASE_DIR/error_logs"
 cd "$LOG_DIR"
@@ -37,7 +37,7 @@ if [ $exit_status -ne 0 ]; then
    exit 1
 fi
 
-scp "youruser@server_host:~/work/journal_logs/$log_file" .
+scp "youruser@server_host:~/work/journal_spool/$log_file" .
 exit_status=$?
 cd ~
 echo "scp $log_file >> exit_status=$exit_status"
@@ -49,19 +49,11 @@ fi
 # python仮想環境 py_psycopg2 に入る
 . ~/py_venv/py_psycopg2/bin/activate
 
-# CSVファイル出力
+# 日次サマリーファイルからデータベース内の該当するテーブルに一括登録 ※CSVファイルも出力
 cd ~/py_project/ServerTools
-python ExportCSV_with_autherrorlog.py --log-file "$LOG_DIR/$log_file" --out-csv
+python BatchInsert_with_autherrorlog.py --summary-file "$LOG_DIR/$log_file" --out-csv
 exit_status=$?
-echo "execute ExportCSV_with_autherrorlog.py >> exit_status=$exit_status"
-if [ $exit_status -ne 0 ]; then
-   echo "Error export CSV!"
-   exit $exit_status
-fi
-
-# データベース内の該当するテーブルに一括登録
-csv_path="$BASE_DIR/csv/ssh_auth_error_$log_date.csv"
-python BatchInsert_with_csv.py --csv-file "$csv_path"
+echo "execute BatchInsert_with_autherrorlog.py >> exit_status=$exit_status"
 
 deactivate
 echo "Done."
@@ -0,0 +1,42 @@
+-- 2024-09-20 RIR_ipv4_allocated に開始IP/終了IP(数値)カラムと範囲検索用インデックスを追加
+-- ip_start (VARCHAR) の LIKE検索 + LPADソートをやめ、数値の範囲検索で一致レコードを取得する
+ALTER TABLE mainte.RIR_ipv4_allocated ADD COLUMN ip_start_num BIGINT;
+ALTER TABLE mainte.RIR_ipv4_allocated ADD COLUMN ip_end_num BIGINT;
+
+-- トリガー関数: ip_start, ip_count から開始IPと終了IP(ブロードキャスト)の数値を計算し設定する
+CREATE FUNCTION mainte.calc_and_set_ip_range_num()
+   RETURNS trigger
+   LANGUAGE plpgsql
+AS $$
+BEGIN
+   NEW.ip_start_num := mainte.compute_ip_number(NEW.ip_start);
+   NEW.ip_end_num := NEW.ip_start_num + NEW.ip_count - 1;
+   RETURN NEW;
+END $$;
+
+-- (1) INSERT 前に ip_start_num, ip_end_num を計算し設定する
+CREATE TRIGGER trigger_insert_set_ip_range_num BEFORE INSERT
+   ON mainte.RIR_ipv4_allocated FOR EACH ROW
+   EXECUTE PROCEDURE mainte.calc_and_set_ip_range_num();
+
+-- (2) UPDATE 前に ip_start または ip_count が変更されたら再計算し設定する
+CREATE TRIGGER trigger_update_set_ip_range_num BEFORE UPDATE
+   ON mainte.RIR_ipv4_allocated FOR EACH ROW
+   WHEN (OLD.ip_start <> NEW.ip_start OR OLD.ip_count <> NEW.ip_count)
+   EXECUTE PROCEDURE mainte.calc_and_set_ip_range_num();
+
+-- 登録済みレコードの数値カラムを設定
+UPDATE mainte.RIR_ipv4_allocated SET
+   ip_start_num = mainte.compute_ip_number(ip_start),
+   ip_end_num = mainte.compute_ip_number(ip_start) + ip_count - 1;
+
+ALTER TABLE mainte.RIR_ipv4_allocated ALTER ip_start_num SET NOT NULL;
+ALTER TABLE mainte.RIR_ipv4_allocated ALTER ip_end_num SET NOT NULL;
+
+-- 範囲検索用インデックス
+--  割当範囲は重複しないため「開始IP <= ターゲットIP」の最大レコードを降順スキャンの先頭1件で取得できる
+--  INCLUDE 列によりテーブルを参照せずインデックスのみで結果を返す
+CREATE UNIQUE INDEX idx_RIR_ipv4_allocated_ip_range
+   ON mainte.RIR_ipv4_allocated(ip_start_num) INCLUDE (ip_end_num, ip_count, country_code);
+
+ALTER FUNCTION mainte.calc_and_set_ip_range_num() OWNER TO developer;
@@ -0,0 +1,10 @@
+-- 2024-09-20 RIR_ipv4_allocated テーブルの洗い替え履歴
+--  LoadRIRDelegated.py の実行ごとに1レコード追加する
+CREATE TABLE mainte.RIR_ipv4_load_history(
+   loaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+   record_count INTEGER NOT NULL
+);
+ALTER TABLE mainte.RIR_ipv4_load_history ADD CONSTRAINT pk_RIR_ipv4_load_history
+  PRIMARY KEY (loaded_at);
+
+ALTER TABLE mainte.RIR_ipv4_load_history OWNER TO developer;
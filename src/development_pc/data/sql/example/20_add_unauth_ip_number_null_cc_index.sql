@@ -0,0 +1,4 @@
+-- 2024-09-21 国コード未設定レコードのキーセットページング用部分インデックス
+--  WHERE country_code IS NULL AND ip_number > [前ページの最終値] ORDER BY ip_number LIMIT [ページサイズ]
+CREATE INDEX idx_unauth_ip_number_null_cc ON mainte.unauth_ip_addr(ip_number)
+   WHERE country_code IS NULL;
@@ -0,0 +1,17 @@
+-- 2024-09-20 RIR_ipv4_allocated の割当範囲をCIDRブロックに分割したテーブル
+--  2のべき乗でない割当 (例: ip_count=3072) も洗い替え時に分割済みのブロックを登録する
+--  ターゲットIPを含むブロックを「cidr >>= ターゲットIP」のインデックス検索1回で取得する
+--  ※データは LoadRIRDelegated.py の洗い替え時に RIR_ipv4_allocated と同一トランザクションで登録する
+CREATE TABLE mainte.RIR_ipv4_cidr(
+   cidr CIDR NOT NULL,
+   ip_start VARCHAR(15) NOT NULL,
+   country_code CHAR(2) NOT NULL
+);
+ALTER TABLE mainte.RIR_ipv4_cidr ADD CONSTRAINT pk_RIR_ipv4_cidr
+  PRIMARY KEY (cidr);
+
+-- 包含検索 (>>=) 用インデックス
+CREATE INDEX idx_RIR_ipv4_cidr_inet_ops
+   ON mainte.RIR_ipv4_cidr USING gist (cidr inet_ops);
+
+ALTER TABLE mainte.RIR_ipv4_cidr OWNER TO developer;
@@ -0,0 +1,136 @@
+import argparse
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from psycopg2.extensions import connection
+
+from db import pgdatabase
+from dao.batch_insert import register_main
+from dao.record.tabledata import AuthErrorCount
+from extract.auth_summary import count_ip_addr_in_summary, extract_summary_date
+from extract.extractor import CSV_HEADER, count_ip_addr, extract_log_date, get_csv_path
+
+import util.file_util as fu
+from log import logsetting
+
+"""
+不正アクセスログファイルから直接2つのテーブルに一括登録する
+ExportCSV_with_autherrorlog.py と BatchInsert_with_csv.py を1プロセスで実行し
+中間ファイルのCSVを経由しない ※CSVは --out-csv 指定時のみ出力
+※ --summary-file 指定時はログファイルの代わりにサーバー側で集計済みの日次サマリーから登録する
+[スキーマ] mainte
+[テーブル]
+  (1) 不正アクセスIPアドレステーブル
+     unauth_ip_addr
+  (2) 不正アクセスエラーカウントテーブル
+     ssh_auth_error
+"""
+
+# データベース接続情報
+DB_CONF_FILE: str = os.path.join("conf", "db_conn.json")
+# 出現回数設定とCSV出力先
+CONF_FILE: str = os.path.join("conf", "export_csv_with_invalid_ip.json")
+
+
+def get_auth_error_counts(
+        log_date: str,
+        counter: Counter,
+        out_count_limit: int) -> List[AuthErrorCount]:
+    # 出現回数が指定件数以上のIPアドレスを出現回数の多い順に抽出
+    return [
+        AuthErrorCount(log_date=log_date, ip_addr=ip_addr, appear_count=cnt)
+        for (ip_addr, cnt) in counter.most_common() if cnt >= out_count_limit
+    ]
+
+
+def save_csv(save_path: str, records: List[AuthErrorCount]) -> None:
+    csv_list: List[str] = [
+        f'"{rec.log_date}","{rec.ip_addr}",{rec.appear_count}' for rec in records
+    ]
+    fu.write_csv(save_path, csv_list, header=CSV_HEADER)
+
+
+def batch_main():
+    app_logger: logging.Logger = logsetting.get_logger("batch_insert")
+    parser: argparse.ArgumentParser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    # 不正アクセスログファイル: ~/Documents/webriverside/error_logs/AuthFail_ssh_[日付].log
+    group.add_argument("--log-file", type=str,
+                       help="Log File name.")
+    # 日次サマリーファイル: ~/Documents/webriverside/error_logs/AuthFail_ssh_[日付].summary.tsv.gz
+    group.add_argument("--summary-file", type=str,
+                       help="Server side summary file name.")
+    # 従来のCSVファイルも出力する
+    parser.add_argument("--out-csv", action="store_true",
+                        help="Output csv.")
+    # CSVファイルを圧縮 (.csv.gz) せずに出力する
+    parser.add_argument("--no-compress", action="store_true",
+                        help="Output uncompressed csv.")
+    parser.add_argument("--enable-debug", action="store_true",
+                        help="Enable logger debug out.")
+    args: argparse.Namespace = parser.parse_args()
+    enable_debug: bool = args.enable_debug
+    is_summary: bool = args.summary_file is not None
+    log_path: str = os.path.expanduser(args.summary_file if is_summary else args.log_file)
+    app_logger.info(f"{'summary-file' if is_summary else 'log-file'}: {log_path}")
+    if not os.path.exists(log_path):
+        app_logger.error(f"FileNotFound: {log_path}")
+        exit(1)
+
+    conf: Dict[str, Any] = fu.read_json(CONF_FILE)
+    # 登録する出現回数
+    out_count_limit: int = conf["out-count-limit"]
+    start_time: float = time.perf_counter()
+    counter: Counter
+    log_date: str
+    if is_summary:
+        counter = count_ip_addr_in_summary(log_path)
+        summary_date: Optional[str] = extract_summary_date(log_path)
+        if summary_date is None:
+            app_logger.error(f"Invalid summary file name: {log_path}")
+            exit(1)
+        log_date = summary_date
+    else:
+        counter = count_ip_addr(log_path)
+        log_date = extract_log_date(log_path)
+    records: List[AuthErrorCount] = get_auth_error_counts(
+        log_date, counter, out_count_limit
+    )
+    app_logger.info(
+        f"log_date: {log_date}, ip_addr: {len(counter)}, register: {len(records)}"
+    )
+    if args.out_csv:
+        save_path: str = get_csv_path(
+            log_date, conf["csv-dir"], compress=not args.no_compress
+        )
+        save_csv(save_path, records)
+        app_logger.info(f"Saved: {save_path}")
+    if len(records) == 0:
+        app_logger.warning("No register record.")
+        exit(0)
+
+    # database
+    db: Optional[pgdatabase.PgDatabase] = None
+    try:
+        db = pgdatabase.PgDatabase(DB_CONF_FILE)
+        conn: connection = db.get_connection()
+        # unauth_ip_addrテーブルとssh_auth_errorテーブル登録トランザクション
+        register_main(conn, records, logger=app_logger, enable_debug=enable_debug)
+        # 両方のテーブル登録で正常終了したらコミット
+        db.commit()
+        app_logger.info(f"elapsed: {time.perf_counter() - start_time:.3f} sec")
+    except Exception as exp:
+        if db is not None:
+            db.rollback()
+        app_logger.error(exp)
+        exit(1)
+    finally:
+        if db is not None:
+            db.close()
+
+
+if __name__ == '__main__':
+    batch_main()
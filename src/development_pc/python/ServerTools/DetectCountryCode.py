@@ -1,196 +1,164 @@
 import argparse
+import csv
+import json
 import logging
 import os
-from dataclasses import dataclass, asdict
-from ipaddress import ip_address, IPv4Address, IPv4Network
-from typing import List, Iterator, Optional, Tuple
+import sys
+from typing import IO, Dict, Iterator, List, Optional, Tuple
 
 import psycopg2
-from psycopg2.extensions import connection, cursor
+from psycopg2.extensions import connection
 
 from db import pgdatabase
-import util.ipv4_util as ipv4_u
+from dao.country_code_name import get_country_name_map
+from dao.rir_ipv4_allocated import get_all_records as get_all_rir_records
+import util.file_util as fu
+import util.ipv4_codec as codec
+from util.rir_lookup import RirLookup
+from util.rir_snapshot import RirSnapshot
+
+"""
+指定したIPアドレスのネットワーク(CIDR表記)と国コード・国名を取得するスクリプト
+  --target-ip: 1件のIPアドレスを検索してログに出力する
+  --input FILE|-: ファイル(または標準入力)の1行1件のIPアドレスを1回の接続で検索し
+    CSV または JSONL (ip,cidr,cc,name) で逐次出力する
+    ※RIRテーブルと国名マスタは接続時に1回だけ読み込む
+    ※入出力ファイルは gzip, xz, zstd 圧縮ファイルも指定可 (util/file_util.open_file)
+  --snapshot [FILE]: データベースに接続せずスナップショットファイルで検索する
+"""
 
 # ログフォーマット
 LOG_FMT: str = '%(levelname)s %(message)s'
 # データベース接続情報
 DB_CONF_FILE: str = os.path.join("conf", "db_conn.json")
+# RIRスナップショットファイル情報
+SNAPSHOT_CONF_FILE: str = os.path.join("conf", "rir_snapshot.json")
+# バッチモードの出力形式
+OUTPUT_FORMATS: Tuple[str, ...] = ("csv", "jsonl")
+CSV_HEADER: List[str] = ["ip", "cidr", "cc", "name"]
 
 
-@dataclass(frozen=True)
-class RirRecord:
-    ip_start: str
-    ip_count: int
-    country_code: str
+def next_target_ip(fp: IO[str], logger: logging.Logger) -> Iterator[Tuple[int, str]]:
+    # 空行とコメント行(#)は読み飛ばし、IPアドレスとして不正な行は警告を出力して除外する
+    for line_no, line in enumerate(fp, start=1):
+        target_ip: str = line.strip()
+        if len(target_ip) == 0 or target_ip.startswith("#"):
+            continue
+        try:
+            ip_num: int = codec.ip_to_int(target_ip)
+        except ValueError:
+            logger.warning(f"line {line_no}: Invalid IP address: {target_ip}")
+            continue
+        yield ip_num, target_ip
 
 
-def get_rir_table_matches(
-        conn: connection,
-        like_ip: str,
-        logger: Optional[logging.Logger] = None) -> List[Tuple[str, int, str]]:
-    if logger is not None:
-        logger.debug(f"like_ip: {like_ip}")
-    result: List[Tuple[str, int, str]]
-    try:
-        cur: cursor
-        # ゼロ埋めしたIPアドレスの昇順にソートする
-        with conn.cursor() as cur:
-            cur.execute("""
-SELECT
-   ip_start,ip_count,country_code
-FROM
-   mainte.RIR_ipv4_allocated
-WHERE
-   ip_start LIKE %(partial_match)s
-ORDER BY
- LPAD(SPLIT_PART(ip_start,'.',1), 3, '0') || '.' ||
- LPAD(SPLIT_PART(ip_start,'.',2), 3, '0') || '.' ||
- LPAD(SPLIT_PART(ip_start,'.',3), 3, '0') || '.' ||
- LPAD(SPLIT_PART(ip_start,'.',4), 3, '0')""",
-                        ({'partial_match': like_ip}))
-            # レコード取得件数チェック
-            if cur.rowcount > 0:
-                rows: List[Tuple[str, int, str]] = cur.fetchall()
-                if logger is not None:
-                    logger.debug(f"rows.size: {len(rows)}")
-                    for row in rows:
-                        logger.debug(f"{row}")
-                result = rows
-            else:
-                # マッチしなかったら空のリスト
-                result = []
-        return result
-    except (Exception, psycopg2.DatabaseError) as err:
-        raise err
-
-
-def get_country_code_name(
-        conn: connection,
-        country_code: str,
-        logger: Optional[logging.Logger] = None) -> Optional[str]:
-    if logger is not None:
-        logger.debug(f"country_code: {country_code}")
-    result: Optional[str]
-    try:
-        cur: cursor
-        # ゼロ埋めしたIPアドレスの昇順にソートする
-        with conn.cursor() as cur:
-            cur.execute("""
-SELECT japanese_name FROM mainte.country_code_name_mst WHERE country_code=%(cc)s""",
-                        ({'cc': country_code})
-                        )
-            # レコード取得件数チェック
-            if cur.rowcount > 0:
-                row: Optional[Tuple] = cur.fetchone()
-                if logger is not None:
-                    logger.debug(f"row: {row}")
-                result = row[0] if row is not None else None
-            else:
-                result = None
-        return result
-    except (Exception, psycopg2.DatabaseError) as err:
-        raise err
-
-
-def get_matches_main(
-        conn: connection,
-        target_ip: str,
-        logger: Optional[logging.Logger] = None) -> Optional[List[Tuple[str, int, str]]]:
-    def make_like_ip(like_old: str) -> Optional[str]:
-        # 末尾の likeプレースホルダを削除する
-        raw_ip: str = like_old.replace(".%", "")
-        fields: List[str] = raw_ip.split(".")
-        # コンマで区切って残りが1つなら終了
-        field_size: int = len(fields)
-        if field_size == 1:
-            return None
-
-        # フィールドを1つ減らす
-        del fields[field_size - 1]
-        # 末尾にlikeプレースホルダ(".%")を付加して終了
-        return ".".join(fields) + ".%"
-
-    target_ip_addr: IPv4Address = ip_address(target_ip)  # type: ignore
-    like_ip: Optional[str] = make_like_ip(target_ip)
-    matches: Optional[List[Tuple[str, int, str]]] = None
-    while like_ip is not None:
-        matches = get_rir_table_matches(conn, like_ip, logger=logger)
-        if len(matches) > 0:
-            # 先頭レコードの開始IPアドレス
-            first_ip: str = matches[0][0]
-            first_ip_addr: IPv4Address = ip_address(first_ip)  # type: ignore
-            # 最終レコードの開始IPアドレス
-            last: Tuple[str, int, str] = matches[-1]
-            last_ip: str = last[0]
-            ip_cnt: int = int(last[1])
-            last_ip_addr: IPv4Address = ip_address(last_ip)  # type: ignore
-            # 最終レコードのブロードキャストアドレス計算
-            broadcast_addr: IPv4Address = last_ip_addr + ip_cnt - 1  # type: ignore
-            if logger is not None:
-                logger.info(f"match_first: {first_ip}, match_last: {last_ip}")
-
-            if first_ip_addr < target_ip_addr < broadcast_addr:
-                # ターゲットIPが先頭レコードの開始IPと最終レコードのブロードキャストの範囲内なら終了
-                if logger is not None:
-                    logger.debug(
-                        f"Range in ({first_ip} < {target_ip} < {str(broadcast_addr)})"
-                        f", break"
-                    )
-                break
-            else:
-                # 範囲外: 次のlike検索文字列を生成して検索処理に戻る
-                like_ip = make_like_ip(like_ip)
-                if logger is not None:
-                    logger.info(f"next {like_ip} continue.")
+def lookup_sorted(
+        rir_lookup: RirLookup,
+        targets: List[Tuple[int, str]]) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    # IPアドレス(数値)の昇順に検索し、直前に一致した割当範囲に含まれる場合は二分探索を省略する
+    last_idx: int = -1
+    for ip_num, target_ip in sorted(targets):
+        idx: int
+        if (last_idx >= 0 and
+                rir_lookup.ip_starts[last_idx] <= ip_num <= rir_lookup.ip_ends[last_idx]):
+            idx = last_idx
         else:
-            # レコード無し: 次のlike検索文字列を生成して検索処理に戻る
-            if logger is not None:
-                logger.info(f"{like_ip} is no match.")
-            like_ip = make_like_ip(like_ip)
-    return matches
+            idx = rir_lookup.find_index(ip_num)
+        if idx < 0:
+            yield target_ip, None, None
+            continue
+        last_idx = idx
+        match_network: Optional[str] = codec.get_cidr_in_range(
+            rir_lookup.ip_starts[idx], rir_lookup.ip_ends[idx], ip_num
+        )
+        yield target_ip, match_network, rir_lookup.country_codes[idx]
 
 
-def detect_cc_in_matches(
-        target_ip: str,
-        matches: List[Tuple[str, int, str]],
-        logger: Optional[logging.Logger] = None) -> Tuple[Optional[str], Optional[str]]:
-    def next_record(rows: List[Tuple[str, int, str]]) -> Iterator[RirRecord]:
-        for (ip_sta, ip_cnt, cc) in rows:
-            yield RirRecord(ip_start=ip_sta, ip_count=ip_cnt, country_code=cc)
-
-    target_ip_addr: IPv4Address = ip_address(target_ip)  # type: ignore
-    match_network: Optional[str] = None
-    match_cc: Optional[str] = None
-    rec: RirRecord
-    for rec in next_record(matches):
-        # ターゲットIP が ネットワークIPアドレスより大きい場合は範囲外のため処理終了
-        if ip_address(rec.ip_start) > target_ip_addr:  # type: ignore
-            if logger is not None:
-                logger.debug(
-                    f"{target_ip} < {rec.ip_start} break. No more match."
-                )
-            # マッチするデータなし
-            break
-
-        # 開始ネットワークIPのブロードキャストアドレスがターゲットIPより小さければ次のレコードへ
-        broadcast_addr: IPv4Address = (
-                ip_address(rec.ip_start) + rec.ip_count - 1)  # type: ignore
-        if broadcast_addr < target_ip_addr:
-            if logger is not None:
-                logger.debug(f"({str(broadcast_addr)} < {target_ip}) -> continue")
-            continue
+def lookup_stream(
+        rir_lookup: RirLookup,
+        targets: Iterator[Tuple[int, str]]) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    # 入力順に逐次検索する
+    for _, target_ip in targets:
+        match_network: Optional[str]
+        match_cc: Optional[str]
+        match_network, match_cc = rir_lookup.lookup(target_ip)
+        yield target_ip, match_network, match_cc
 
-        cidr_cc_list: List[Tuple[IPv4Network, str]] = ipv4_u.get_cidr_cc_list(
-            **asdict(rec)
-        )
-        if logger is not None:
-            logger.debug(cidr_cc_list)
-        match_network, match_cc = ipv4_u.detect_cc_in_cidr_cc_list(
-            target_ip, cidr_cc_list
+
+def write_results(
+        out: IO[str],
+        output_format: str,
+        results: Iterator[Tuple[str, Optional[str], Optional[str]]],
+        country_names: Dict[str, str]) -> Tuple[int, int]:
+    # 戻り値: (出力件数, 国コード不明件数)
+    csv_writer = None
+    if output_format == "csv":
+        csv_writer = csv.writer(out, lineterminator="\n")
+        csv_writer.writerow(CSV_HEADER)
+    output_cnt: int = 0
+    unknown_cnt: int = 0
+    for target_ip, match_network, match_cc in results:
+        cc_name: Optional[str] = country_names.get(match_cc) if match_cc is not None else None
+        if match_cc is None:
+            unknown_cnt += 1
+        if csv_writer is not None:
+            # 不明な値は空文字
+            csv_writer.writerow(
+                [target_ip, match_network or "", match_cc or "", cc_name or ""]
+            )
+        else:
+            out.write(json.dumps(
+                {"ip": target_ip, "cidr": match_network, "cc": match_cc, "name": cc_name},
+                ensure_ascii=False
+            ) + "\n")
+        output_cnt += 1
+    return output_cnt, unknown_cnt
+
+
+def single_main(
+        rir_lookup: RirLookup,
+        country_names: Dict[str, str],
+        target_ip: str,
+        logger: logging.Logger) -> None:
+    # ターゲットIPのネットワーク(CIDR表記)と国コードを取得する
+    network: Optional[str]
+    cc: Optional[str]
+    network, cc = rir_lookup.lookup(target_ip)
+    if network is not None and cc is not None:
+        cc_name: Optional[str] = country_names.get(cc)
+        logger.info(
+            f'Find {target_ip} in (network: "{network}", "{cc}:{cc_name}")'
         )
-        break
+    else:
+        logger.warning(f"Not exists in RIR table.")
 
-    return match_network, match_cc
+
+def batch_main(
+        rir_lookup: RirLookup,
+        country_names: Dict[str, str],
+        input_file: str,
+        output_file: Optional[str],
+        output_format: str,
+        sort_input: bool,
+        logger: logging.Logger) -> None:
+    # 圧縮ファイル (gzip, xz, zstd) は展開しながら読み込む ※出力は拡張子で圧縮形式を判定
+    in_fp: IO[str] = sys.stdin if input_file == "-" else fu.open_file(input_file, "rt")
+    out_fp: IO[str] = sys.stdout if output_file is None else fu.open_file(output_file, "wt")
+    try:
+        targets: Iterator[Tuple[int, str]] = next_target_ip(in_fp, logger)
+        results: Iterator[Tuple[str, Optional[str], Optional[str]]]
+        if sort_input:
+            # ソートのため入力を全件読み込む
+            results = lookup_sorted(rir_lookup, list(targets))
+        else:
+            results = lookup_stream(rir_lookup, targets)
+        output_cnt, unknown_cnt = write_results(out_fp, output_format, results, country_names)
+        logger.info(f"Resolved: {output_cnt}, unknown: {unknown_cnt}")
+    finally:
+        if in_fp is not sys.stdin:
+            in_fp.close()
+        if out_fp is not sys.stdout:
+            out_fp.close()
 
 
 def exec_main():
@@ -198,49 +166,96 @@ def exec_main():
     app_logger = logging.getLogger(__name__)
     app_logger.setLevel(level=logging.DEBUG)
     parser = argparse.ArgumentParser()
-    parser.add_argument("--target-ip", required=True, type=str,
-                        help="IP address.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--target-ip", type=str,
+                       help="IP address.")
+    # 1行1件のIPアドレスファイル ("-" は標準入力)
+    group.add_argument("--input", type=str,
+                       help="IP address list file or '-' (stdin).")
+    # --input 指定時の出力先 (省略時は標準出力)
+    parser.add_argument("--output", type=str,
+                        help="Output file with --input.")
+    parser.add_argument("--format", type=str, choices=OUTPUT_FORMATS,
+                        help="Output format with --input. (default csv)")
+    # 入力をIPアドレスの昇順にソートして出力する ※隣接するIPは同じ割当範囲を再利用する
+    parser.add_argument("--sort", action="store_true",
+                        help="Sort input IP addresses.")
+    # データベースの代わりに ExportRIRSnapshot.py で出力したスナップショットファイルで検索する
+    #  ※ファイル名省略時は conf/rir_snapshot.json の出力先
+    parser.add_argument("--snapshot", type=str, nargs="?", const="",
+                        help="Lookup with RIR snapshot file instead of database.")
     parser.add_argument("--enable-debug", action="store_true",
                         help="Enable logger debug out.")
     args: argparse.Namespace = parser.parse_args()
-    target_ip: str = args.target_ip
+    target_ip: Optional[str] = args.target_ip
+    if target_ip is not None and (
+            args.output is not None or args.format is not None or args.sort):
+        # 1件の検索結果はログに出力するため出力先の指定は無効
+        parser.error("--output, --format and --sort require --input.")
+    if target_ip is not None:
+        try:
+            codec.ip_to_int(target_ip)
+        except ValueError as err:
+            parser.error(str(err))
+    output_format: str = args.format if args.format is not None else OUTPUT_FORMATS[0]
     enable_debug: bool = args.enable_debug
-    app_logger.info(f"target_ip: {target_ip}, enable_debug: {enable_debug}")
+    app_logger.info(f"target_ip: {target_ip}, input: {args.input}, enable_debug: {enable_debug}")
+
+    rir_lookup: RirLookup
+    country_names: Dict[str, str]
+    if args.snapshot is not None:
+        snapshot_file: str = os.path.expanduser(
+            args.snapshot if len(args.snapshot) > 0
+            else fu.read_json(SNAPSHOT_CONF_FILE)["snapshot-file"]
+        )
+        try:
+            snapshot: RirSnapshot = RirSnapshot(snapshot_file)
+        except (ValueError, OSError) as err:
+            app_logger.error(err)
+            exit(1)
+        if enable_debug:
+            app_logger.debug(
+                f"snapshot: {snapshot_file}, size: {len(snapshot)}"
+                f", loaded_at: {snapshot.rir_loaded_at}"
+            )
+        rir_lookup, country_names = snapshot, snapshot.country_names
+    else:
+        db: Optional[pgdatabase.PgDatabase] = None
+        try:
+            db = pgdatabase.PgDatabase(DB_CONF_FILE, logger=None)
+            conn: connection = db.get_connection()
+            # RIRテーブルと国名マスタを1回だけ読み込む
+            rir_lookup = RirLookup(
+                get_all_rir_records(conn), logger=app_logger if enable_debug else None
+            )
+            country_names = get_country_name_map(
+                conn, logger=app_logger if enable_debug else None
+            )
+        except psycopg2.Error as db_err:
+            app_logger.error(db_err)
+            exit(1)
+        except Exception as exp:
+            app_logger.error(exp)
+            exit(1)
+        finally:
+            if db is not None:
+                db.close()
 
-    db: Optional[pgdatabase.PgDatabase] = None
     try:
-        db = pgdatabase.PgDatabase(DB_CONF_FILE, logger=None)
-        conn: connection = db.get_connection()
-        matches: Optional[List[Tuple[str, int, str]]] = get_matches_main(
-            conn, target_ip, logger=app_logger if enable_debug else None)
-
-        # ターゲットIPのネットワーク(CIDR表記)と国コードを取得する
-        if matches is not None and len(matches) > 0:
-            network: Optional[str]
-            cc: Optional[str]
-            network, cc = detect_cc_in_matches(
-                target_ip, matches, logger=app_logger if enable_debug else None)
-            if network is not None and cc is not None:
-                cc_name: Optional[str] = get_country_code_name(
-                    conn, cc, logger=app_logger if enable_debug else None
-                )
-                app_logger.info(
-                    f'Find {target_ip} in (network: "{network}", "{cc}:{cc_name}")'
-                )
-            else:
-                app_logger.info(f"Not match in data.")
+        if target_ip is not None:
+            single_main(rir_lookup, country_names, target_ip, app_logger)
         else:
-            # このケースは想定しない
-            app_logger.warning(f"Not exists in RIR table.")
-    except psycopg2.Error as db_err:
-        app_logger.error(db_err)
-        exit(1)
-    except Exception as exp:
-        app_logger.error(exp)
+            batch_main(
+                rir_lookup, country_names, args.input, args.output, output_format, args.sort,
+                app_logger
+            )
+    except (ValueError, OSError) as err:
+        # 入出力ファイルのエラー
+        app_logger.error(err)
         exit(1)
     finally:
-        if db is not None:
-            db.close()
+        if isinstance(rir_lookup, RirSnapshot):
+            rir_lookup.close()
 
 
 if __name__ == '__main__':
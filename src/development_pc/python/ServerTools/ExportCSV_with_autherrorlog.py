@@ -1,11 +1,12 @@
 import argparse
 import logging
 import os
-import re
 from collections import Counter
-from datetime import date
-from typing import Any, List, Dict, Optional
+from typing import Any, List, Dict
 import util.file_util as fu
+from extract.extractor import (
+    CSV_HEADER, count_ip_addr, count_ip_addr_parallel, extract_log_date, get_csv_path
+)
 
 """
 example.com サーバーでjournalctlでsshサービスに関連したログインエラーログファイルから
@@ -14,39 +15,6 @@ example.com サーバーでjournalctlでsshサービスに関連したログイ
 
 CONF_FILE: str = os.path.join("conf", "export_csv_with_invalid_ip.json")
 
-# rhhost の後ろに何もないケースと "user=xxx"があるパターンがある
-# authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost=218.92.0.96 user=root
-# authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost=216.181.226.86
-re_auth_fail: re.Pattern = re.compile(
-    r"^.+?rhost=([0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}).*$"
-)
-# ファイル名のログ日付抽出
-re_log_file: re.Pattern = re.compile(r"^AuthFail_ssh_(\d{4}-\d{2}-\d{2})\.log$")
-FMT_OUT_CSV: str = "ssh_auth_error_{}.csv"
-# CSV format
-CSV_HEADER: str = '"log_date","ip_addr","appear_count"'
-
-
-def extract_log_date(file_path: str) -> str:
-    # ファイル名から日付を取得
-    b_name: str = os.path.basename(file_path)
-    f_mat: Optional[re.Match] = re_log_file.search(b_name)
-    if f_mat:
-        return f_mat.group(1)
-    else:
-        return date.today().isoformat()
-
-
-def get_csv_path(s_date: str, out_csv_dir: str) -> str:
-    save_name: str = FMT_OUT_CSV.format(s_date)
-    return os.path.join(os.path.expanduser(out_csv_dir), save_name)
-
-
-def file_read(file_name: str):
-    with open(file_name, 'r') as fp:
-        for ln in fp:
-            yield ln
-
 
 def batch_main():
     logging.basicConfig(format="%(message)s")
@@ -56,12 +24,17 @@ def batch_main():
     parser.add_argument("--log-file", required=True, type=str, help="Log File name.")
     parser.add_argument("--show-top", type=int, help="Show top N.")
     parser.add_argument("--out-csv", action="store_true", help="Output csv.")
+    # CSVファイルを圧縮 (.csv.gz) せずに出力する
+    parser.add_argument("--no-compress", action="store_true",
+                        help="Output uncompressed csv.")
+    # ログファイルを改行位置で分割して複数プロセスで並列に集計する ※出力内容は1プロセスと同じ
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Parallel parse processes. (0: cpu count)")
     args: argparse.Namespace = parser.parse_args()
     app_logger.info(args)
 
     is_out_csv: bool = args.out_csv
     f_path: str = os.path.expanduser(args.log_file)
-    lines = file_read(f_path)
     # 出現回数設定
     conf: Dict[str, Any] = fu.read_json(CONF_FILE)
     # CSV出力するカウンター数
@@ -71,17 +44,17 @@ def batch_main():
     if args.show_top is not None:
         show_top = int(args.show_top)
 
-    ip_list: List = []
-    for line in lines:
-        mat: Optional[re.Match] = re_auth_fail.search(line)
-        if mat:
-            ip_list.append(mat.group(1))
-    list_size: int = len(ip_list)
+    # 抽出した ip の出現数をカウント ※IPリストは作成しない
+    jobs: int = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    counter: Counter
+    if jobs > 1:
+        counter = count_ip_addr_parallel(f_path, jobs)
+    else:
+        counter = count_ip_addr(f_path)
+    list_size: int = sum(counter.values())
     app_logger.info(f"ip_list.size: {list_size}")
 
     if list_size > 0:
-        # 抽出した ip の出現数をカウント
-        counter: Counter = Counter(ip_list)
         if not is_out_csv:
             # コンソール出力の場合: Top N
             for item in counter.most_common(show_top):
@@ -96,7 +69,9 @@ def batch_main():
                     csv_line: str = f'"{log_date}","{ip_addr}",{cnt}'
                     csv_list.append(csv_line)
             app_logger.info(f"output_lines: {len(csv_list)}")
-            save_path: str = get_csv_path(log_date, conf["csv-dir"])
+            save_path: str = get_csv_path(
+                log_date, conf["csv-dir"], compress=not args.no_compress
+            )
             fu.write_csv(save_path, csv_list, header=CSV_HEADER)
             app_logger.info(f"Saved: {save_path}")
 
@@ -0,0 +1,86 @@
+import argparse
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+import psycopg2
+from psycopg2.extensions import connection
+
+from db import pgdatabase
+from dao.country_code_name import get_country_name_map
+from dao.rir_ipv4_allocated import (
+    get_all_records as get_all_rir_records,
+    get_last_loaded_at as get_rir_last_loaded_at
+)
+import util.file_util as fu
+from util.rir_lookup import RirLookup
+from util.rir_snapshot import write_snapshot
+
+"""
+RIR_ipv4_allocated テーブルと国コードマスタ (country_code_name_mst) をスナップショットファイルに出力する
+出力したファイルは DetectCountryCode.py, ExportSQL_updateCC.py の --snapshot で使用する
+※データベースが起動していない環境でも国コードを検索できる
+※RIRテーブルを洗い替え (LoadRIRDelegated.py) したら再出力すること
+"""
+
+# ログフォーマット
+LOG_FMT: str = '%(levelname)s %(message)s'
+# データベース接続情報
+DB_CONF_FILE: str = os.path.join("conf", "db_conn.json")
+# 出力先情報
+CONF_FILE: str = os.path.join("conf", "rir_snapshot.json")
+
+
+def export_main():
+    logging.basicConfig(format=LOG_FMT)
+    app_logger = logging.getLogger(__name__)
+    app_logger.setLevel(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", type=str,
+                        help="Snapshot file. (default conf/rir_snapshot.json)")
+    parser.add_argument("--enable-debug", action="store_true",
+                        help="Enable logger debug out.")
+    args: argparse.Namespace = parser.parse_args()
+    enable_debug: bool = args.enable_debug
+    if enable_debug:
+        app_logger.setLevel(level=logging.DEBUG)
+
+    conf: Dict[str, Any] = fu.read_json(CONF_FILE)
+    snapshot_file: str = os.path.expanduser(
+        args.output if args.output is not None else conf["snapshot-file"]
+    )
+    snapshot_dir: str = os.path.dirname(snapshot_file)
+    if len(snapshot_dir) > 0 and not os.path.exists(snapshot_dir):
+        os.makedirs(snapshot_dir)
+
+    start_time: float = time.perf_counter()
+    db: Optional[pgdatabase.PgDatabase] = None
+    try:
+        db = pgdatabase.PgDatabase(DB_CONF_FILE, logger=None)
+        conn: connection = db.get_connection()
+        rir_lookup: RirLookup = RirLookup(
+            get_all_rir_records(conn), logger=app_logger if enable_debug else None
+        )
+        country_names: Dict[str, str] = get_country_name_map(conn, logger=None)
+        rir_loaded_at: Optional[str] = get_rir_last_loaded_at(conn, logger=None)
+    except psycopg2.Error as db_err:
+        app_logger.error(db_err)
+        exit(1)
+    except Exception as exp:
+        app_logger.error(exp)
+        exit(1)
+    finally:
+        if db is not None:
+            db.close()
+
+    records: int = write_snapshot(snapshot_file, rir_lookup, country_names, rir_loaded_at)
+    app_logger.info(
+        f"Saved: {snapshot_file}, records: {records}, loaded_at: {rir_loaded_at}"
+        f", size: {os.path.getsize(snapshot_file)} bytes"
+        f", elapsed: {time.perf_counter() - start_time:.3f} sec"
+    )
+
+
+if __name__ == '__main__':
+    export_main()
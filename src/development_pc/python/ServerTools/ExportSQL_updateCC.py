@@ -1,29 +1,40 @@
 import argparse
 import logging
 import os
+import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from dataclasses import asdict, dataclass
-from ipaddress import ip_address, IPv4Address, IPv4Network
-import typing
-from typing import Any, List, Dict, Iterator, Optional, Tuple
+from dataclasses import dataclass
+from typing import Any, List, Dict, Optional, Tuple
 
 import psycopg2
 from psycopg2.extensions import connection, cursor
 
 from db import pgdatabase
+from dao.country_code_name import get_country_name_map
+from dao.prepared import get_stats as get_prepared_stats
+from dao.rir_ipv4_cidr import bulk_get_cidr_matches
+from dao.unauth_ip_addr import bulk_update_country_code, get_null_cc_page
 from dao.rir_ipv4_allocated import (
-    RirRecord, make_like_ip, get_rir_table_matches
+    RirRecord,
+    get_all_records as get_all_rir_records,
+    bulk_get_matches_with_ip_number as bulk_get_rir_matches,
+    get_last_loaded_at as get_rir_last_loaded_at
 )
 
-import util.ipv4_util as ipv4_u
 import util.file_util as fu
+import util.ipv4_codec as codec
+from util.cidr_cache import CidrCache
+from util.rir_lookup import RirLookup
+from util.rir_snapshot import RirSnapshot
 from log import logsetting
 
 """
 国コード更新用SQL出力バッチスクリプト
-RIR_ipv4_allocated テーブルから各IPアドレスに部分一致するRIRレコードを取得し、
-更新用SQLとその他有用な情報を出力する
+RIR_ipv4_allocated テーブルの全レコードをメモリに展開し、各IPアドレスが属する割当範囲を
+二分探索で取得して更新用SQLとその他有用な情報を出力する
+※ --apply 指定時は1トランザクション・1クエリで国コードを直接一括更新する (SQLファイル出力は --no-output-sql で抑止)
 
 [テーブル]
 (1) 不正アクセスIPアドレスマスタ (mainte.unath_ip_addr)
@@ -37,19 +48,31 @@ RIR_ipv4_allocated テーブルから各IPアドレスに部分一致するRIR
 2. IPアドレスが所属するネットワークアドレスと国コードを紐付けるファイル
     ~/Documents/webriverside/match-networks/
       ip_network_cc_with_hosts_YYYY-mm-dd.txt
+      ※行形式: "IPネットワーク","国コード","国名",["ホスト1","ホスト2",...]
       ※国コード不明IPアドレスリスト
       unknown_ip_hosts_YYYY-mm-dd.txt
+※ --snapshot 指定時はRIRテーブルの代わりにスナップショットファイル (ExportRIRSnapshot.py で出力) を使用する
+3. IPネットワークと国コードの永続キャッシュ (次回以降の実行で使用)
+    ~/Documents/webriverside/match-networks/
+      cidr_cc_cache.sqlite3
+      ※洗い替え履歴テーブル (19_create_RIR_load_history.sql) 未適用の場合はキャッシュを使用しない
 """
 
 # データベース接続情報
 DB_CONF_FILE: str = os.path.join("conf", "db_conn.json")
 # 出力先情報
 CONF_FILE: str = os.path.join("conf", "export_sql_with_ip_country_code.json")
+# RIRスナップショットファイル情報
+SNAPSHOT_CONF_FILE: str = os.path.join("conf", "rir_snapshot.json")
 
 # UPDATEクエリーフォーマット
 FMT_SQL: str = "UPDATE mainte.unauth_ip_addr SET country_code='{}' WHERE ip_addr='{}';"
 # 国コード不明
 CC_UNKNOWN: str = "??"
+# IPネットワークと国コードの永続キャッシュファイル ※match-networks-dir に保存
+CIDR_CACHE_FILE: str = "cidr_cc_cache.sqlite3"
+# pg_stat_activity に表示するアプリケーション名
+APPLICATION_NAME: str = "ExportSQL_updateCC"
 
 
 # ネットワークアドレス(Ipv4)の国コードとホストIPアドレスリストを保持するデータクラス
@@ -89,148 +112,312 @@ SELECT ip_addr FROM mainte.unauth_ip_addr
         raise errors
 
 
-@typing.no_type_check
-def detect_cc_in_matches(
-        target_ip_addr: IPv4Address,
-        matches: List[Tuple[str, int, str]],
-        param_dict_ip_net: Optional[Dict[str, IpNetworkWithCC]] = None,
-        logger: Optional[logging.Logger] = None) -> Tuple[Optional[str], Optional[str]]:
-
-    def next_record(rows: List[Tuple[str, int, str]]) -> Iterator[RirRecord]:
-        for (ip_sta, ip_cnt, country_code) in rows:
-            yield RirRecord(ip_start=ip_sta, ip_count=ip_cnt, country_code=country_code)
-
-    match_network: Optional[str] = None
-    match_cc: Optional[str] = None
-    rec: RirRecord
-    for rec in next_record(matches):
-        # ターゲットIP が ネットワークIPアドレスより大きい場合は範囲外のため処理終了
-        if ip_address(rec.ip_start) > target_ip_addr:  # type: ignore
-            # マッチするデータなし
-            break
-
-        # 開始ネットワークIPのブロードキャストアドレスがターゲットIPより小さければ次のレコードへ
-        broadcast_addr: IPv4Address = (
-                ip_address(rec.ip_start) + rec.ip_count - 1)  # type: ignore
-        if broadcast_addr < target_ip_addr:
-            continue
-
-        cidr_cc_list: List[Tuple[IPv4Network, str]] = ipv4_u.get_cidr_cc_list(
-            **asdict(rec)
+def add_network_host(
+        dict_ip_net: Dict[str, IpNetworkWithCC],
+        match_network: str,
+        match_cc: str,
+        target_ip: str) -> None:
+    # IPネットワークに属する全てのホストをリストに追加
+    data: Optional[IpNetworkWithCC] = dict_ip_net.get(match_network)
+    if data is None:
+        # 辞書オブジェクトに存在しない場合はレコードを追加
+        dict_ip_net[match_network] = IpNetworkWithCC(
+            ip_network=match_network,
+            country_code=match_cc,
+            ip_hosts=[target_ip]
         )
-        if logger is not None:
-            logger.debug(cidr_cc_list)
-        match_network, match_cc = ipv4_u.detect_cc_in_cidr_cc_list(
-            str(target_ip_addr), cidr_cc_list
+    else:
+        # 辞書オブジェクトに存在したらターケットをホストリストに追加
+        data.ip_hosts.append(target_ip)
+
+
+def lookup_ip_list(
+        rir_lookup: RirLookup,
+        target_ip_list: List[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+    # メモリ上のRIRデータから各IPのネットワークアドレスと国コードを一括で取得する
+    return rir_lookup.lookup_bulk(target_ip_list)
+
+
+def db_resolve_ip_list(
+        conn: connection,
+        target_ip_list: List[str],
+        cidr_table: bool = False,
+        logger: Optional[logging.Logger] = None
+        ) -> List[Tuple[Optional[str], Optional[str]]]:
+    if cidr_table:
+        # 分割済みのCIDRブロックテーブルからネットワークと国コードをそのまま取得する
+        cidr_matches: Dict[str, Tuple[str, str]] = bulk_get_cidr_matches(
+            conn, target_ip_list, logger=logger
+        )
+        return [cidr_matches.get(target_ip, (None, None)) for target_ip in target_ip_list]
+
+    # ターゲットIPリスト全件を1回のクエリでRIRテーブルと突き合わせる
+    ip_numbers: List[int] = [codec.ip_to_int(target_ip) for target_ip in target_ip_list]
+    matches: Dict[int, RirRecord] = bulk_get_rir_matches(conn, ip_numbers, logger=logger)
+    result: List[Tuple[Optional[str], Optional[str]]] = []
+    for ip_num in ip_numbers:
+        rec: Optional[RirRecord] = matches.get(ip_num)
+        if rec is not None:
+            ip_first: int = codec.ip_to_int(rec.ip_start)
+            match_network: Optional[str] = codec.get_cidr_in_range(
+                ip_first, ip_first + rec.ip_count - 1, ip_num
+            )
+            result.append((match_network, rec.country_code))
+        else:
+            result.append((None, None))
+    return result
+
+
+class CountryResolver(object):
+    # ターゲットIPのネットワークと国コードを 永続キャッシュ -> RIRデータ の順に取得する
+    #  RIRデータ: メモリに展開したRIRテーブル または データベース側の範囲インデックス
+    def __init__(self,
+                 conn: connection,
+                 db_resolve: bool,
+                 cidr_cache: Optional[CidrCache] = None,
+                 workers: int = 1,
+                 rir_lookup: Optional[RirLookup] = None,
+                 cidr_table: bool = False,
+                 logger: Optional[logging.Logger] = None):
+        self.conn = conn
+        self.db_resolve = db_resolve
+        # データベース側の検索で CIDRブロックテーブル (RIR_ipv4_cidr) を使用する
+        self.cidr_table = cidr_table
+        self.cidr_cache = cidr_cache
+        self.workers = workers
+        self.logger = logger
+        # 並列検索時のワーカー用コネクションプール ※初回検索時に生成
+        self.worker_pool: Optional[pgdatabase.PgDatabasePool] = None
+        # キャッシュで全て解決できればRIRテーブルを読み込まない
+        #  ※スナップショットファイル (RirSnapshot) を指定した場合はRIRテーブルを読み込まない
+        self.rir_lookup: Optional[RirLookup] = rir_lookup
+
+    def get_rir_lookup(self) -> RirLookup:
+        if self.rir_lookup is None:
+            # RIRテーブルを1回だけ読み込む
+            self.rir_lookup = RirLookup(get_all_rir_records(self.conn), logger=self.logger)
+        return self.rir_lookup
+
+    def resolve(self,
+                target_ip_list: List[str],
+                conn: Optional[connection] = None) -> List[Tuple[Optional[str], Optional[str]]]:
+        # conn: データベース側の検索に使用する接続 ※省略時は生成時の接続
+        result: List[Tuple[Optional[str], Optional[str]]] = [(None, None)] * len(target_ip_list)
+        # キャッシュにないIPアドレスのインデックス
+        miss_indexes: List[int] = []
+        for i, target_ip in enumerate(target_ip_list):
+            cached: Optional[Tuple[str, str]] = (
+                self.cidr_cache.get(target_ip) if self.cidr_cache is not None else None
+            )
+            if cached is not None:
+                result[i] = cached
+            else:
+                miss_indexes.append(i)
+        if len(miss_indexes) == 0:
+            return result
+
+        miss_ip_list: List[str] = [target_ip_list[i] for i in miss_indexes]
+        miss_matches: List[Tuple[Optional[str], Optional[str]]]
+        if self.db_resolve and self.workers > 1:
+            miss_matches = self.parallel_db_resolve(miss_ip_list)
+        elif self.db_resolve:
+            # データベース側の範囲インデックスで一括検索
+            miss_matches = db_resolve_ip_list(
+                conn if conn is not None else self.conn, miss_ip_list, cidr_table=self.cidr_table, logger=self.logger
+            )
+        else:
+            miss_matches = lookup_ip_list(self.get_rir_lookup(), miss_ip_list)
+        for i, (match_network, match_cc) in zip(miss_indexes, miss_matches):
+            result[i] = (match_network, match_cc)
+            if self.cidr_cache is not None and match_network is not None \
+                    and match_cc is not None:
+                self.cidr_cache.put(match_network, match_cc)
+        return result
+
+    def parallel_db_resolve(
+            self, target_ip_list: List[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+        if self.worker_pool is None:
+            self.worker_pool = pgdatabase.PgDatabasePool(
+                DB_CONF_FILE, minconn=self.workers, maxconn=self.workers,
+                application_name=APPLICATION_NAME, logger=self.logger
+            )
+        worker_pool: pgdatabase.PgDatabasePool = self.worker_pool
+        # ターゲットIPリストを連続した区間に分割し、ワーカー毎にプールの接続で検索する
+        chunk_size: int = -(-len(target_ip_list) // self.workers)
+        chunks: List[List[str]] = [
+            target_ip_list[i:i + chunk_size] for i in range(0, len(target_ip_list), chunk_size)
+        ]
+
+        def resolve_chunk(worker_no: int) -> List[Tuple[Optional[str], Optional[str]]]:
+            # ワーカー毎にプールから接続を取得し、終了したら返却する
+            worker_conn: connection
+            with worker_pool.session() as worker_conn:
+                return db_resolve_ip_list(
+                    worker_conn, chunks[worker_no], cidr_table=self.cidr_table,
+                    logger=self.logger
+                )
+
+        result: List[Tuple[Optional[str], Optional[str]]] = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # map() は入力順に結果を返すため元のリスト順で結合される
+            for matches in executor.map(resolve_chunk, range(len(chunks))):
+                result.extend(matches)
+        return result
+
+    def close(self) -> None:
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+            self.worker_pool = None
+
+
+def open_cidr_cache(
+        db: pgdatabase.PgDatabase, cache_dir: str,
+        snapshot: Optional[RirSnapshot],
+        logger: logging.Logger) -> Optional[CidrCache]:
+    if snapshot is not None:
+        # スナップショットで検索する場合はスナップショット作成時の洗い替え日時でキャッシュを判定する
+        #  ※データベースの洗い替え日時で保存すると古いスナップショットの結果が新しい日時で残るため
+        if snapshot.rir_loaded_at is None:
+            logger.warning("RirSnapshot has no loaded_at. CidrCache disabled.")
+            return None
+        return CidrCache(
+            os.path.join(cache_dir, CIDR_CACHE_FILE), snapshot.rir_loaded_at, logger=logger
         )
-        if match_network is not None and match_cc is not None:
-            # ネットワークと国コードが取得できた
-            if param_dict_ip_net is not None:
-                # IPネットワークに属する全てのホストをリストに追加
-                data: Optional[IpNetworkWithCC] = param_dict_ip_net.get(match_network)
-                if data is None:
-                    # 辞書オブジェクトに存在しない場合はレコードを追加
-                    param_dict_ip_net[match_network] = IpNetworkWithCC(
-                        ip_network=match_network,
-                        country_code=match_cc,
-                        ip_hosts=[str(target_ip_addr)]
-                    )
-                else:
-                    # 辞書オブジェクトに存在したらターケットをホストリストに追加
-                    data.ip_hosts.append(str(target_ip_addr))
 
-    return match_network, match_cc
+    try:
+        rir_loaded_at: Optional[str] = get_rir_last_loaded_at(db.get_connection(), logger=None)
+    except psycopg2.errors.UndefinedTable:
+        # 洗い替え履歴テーブル (19_create_RIR_load_history.sql) 未適用の場合は
+        #  キャッシュの破棄を判定できないためキャッシュを使用しない
+        db.rollback()
+        logger.warning("RIR_ipv4_load_history not found. CidrCache disabled.")
+        return None
+
+    return CidrCache(
+        os.path.join(cache_dir, CIDR_CACHE_FILE),
+        rir_loaded_at if rir_loaded_at is not None else "",
+        logger=logger
+    )
 
 
 def rir_table_matches_main(
-        conn: connection,
         target_ip_list: List[str],
+        match_list: List[Tuple[Optional[str], Optional[str]]],
         dict_ip_network_cc: Optional[Dict[str, IpNetworkWithCC]],
         unknown_ip_list: Optional[List[str]],
         sql_lines: Optional[List[str]],
-        logger: logging.Logger, enable_debug: bool = False) -> None:
+        logger: logging.Logger, enable_debug: bool = False) -> List[Tuple[str, str]]:
+    # 戻り値: 国コード更新用の (IPアドレス, 国コード) リスト
+    ip_cc_list: List[Tuple[str, str]] = []
     for i, target_ip in enumerate(target_ip_list):
-        logger.info(f"{i + 1:04d}: START {target_ip}")
-        target_ip_addr: IPv4Address = ip_address(target_ip)  # type: ignore
-        like_ip: Optional[str] = make_like_ip(target_ip)
-        matches: Optional[List[Tuple[str, int, str]]] = None
-        while like_ip is not None:
-            matches = get_rir_table_matches(conn, like_ip, logger=None)
-            if len(matches) > 0:
-                # 先頭レコードの開始IPアドレス
-                first_ip: str = matches[0][0]
-                first_ip_addr: IPv4Address = ip_address(first_ip)  # type: ignore
-                # 最終レコードの開始IPアドレス
-                last: Tuple[str, int, str] = matches[-1]
-                last_ip: str = last[0]
-                ip_cnt: int = int(last[1])
-                last_ip_addr: IPv4Address = ip_address(last_ip)  # type: ignore
-                # 最終レコードのブロードキャストアドレス計算
-                broadcast_addr: IPv4Address = last_ip_addr + ip_cnt - 1  # type: ignore
-                if enable_debug:
-                    logger.debug(f"{i + 1:04d}: first_ip: {first_ip}, last_ip: {last_ip}")
-
-                if first_ip_addr < target_ip_addr < broadcast_addr:
-                    # ターゲットIPが先頭レコードの開始IPと最終レコードのブロードキャストの範囲内なら終了
-                    if logger is not None:
-                        logger.debug(
-                            f"Range in ({first_ip} < {target_ip} < {str(broadcast_addr)})"
-                            f", break"
-                        )
-                    break
-                else:
-                    # 範囲外: 次のlike検索文字列を生成して検索処理に戻る
-                    like_ip = make_like_ip(like_ip)
-                    if logger is not None:
-                        logger.info(f"next {like_ip} continue.")
-            else:
-                # レコード無し: 次のlike検索文字列を生成して検索処理に戻る
-                if enable_debug:
-                    logger.debug(f"{like_ip} is no match.")
-                like_ip = make_like_ip(like_ip)
-
-        # ターケットIPが属するネットワークアドレスと国コードを取得する
-        upd_cc: Optional[str]
-        if matches is not None and len(matches) > 0:
-            match_network: Optional[str]
-            match_cc: Optional[str]
-            match_network, match_cc = detect_cc_in_matches(
-                target_ip_addr,
-                matches,
-                param_dict_ip_net=dict_ip_network_cc,
-                logger=logger if enable_debug else None
-            )
-            upd_cc = match_cc if match_cc is not None else CC_UNKNOWN
-            logger.info(f"{i + 1:04d}: END   {target_ip}, {upd_cc}")
-            if upd_cc == CC_UNKNOWN:
-                if unknown_ip_list is not None:
-                    unknown_ip_list.append(target_ip)
+        # ターケットIPが属するネットワークアドレスと国コード
+        match_network: Optional[str]
+        match_cc: Optional[str]
+        match_network, match_cc = match_list[i]
+        if enable_debug:
+            logger.debug(f"{i + 1:04d}: {target_ip} in {match_network}")
+        upd_cc: str
+        if match_network is not None and match_cc is not None:
+            upd_cc = match_cc
+            if dict_ip_network_cc is not None:
+                add_network_host(dict_ip_network_cc, match_network, match_cc, target_ip)
+            logger.info(f"{i + 1:04d}: {target_ip}, {upd_cc}")
         else:
             # 一致なし
             upd_cc = CC_UNKNOWN
             logger.warning(
-                f"{i + 1:04d}: END   {target_ip}, RIR_ipv4_allocated no match."
+                f"{i + 1:04d}: {target_ip}, RIR_ipv4_allocated no match."
             )
             if unknown_ip_list is not None:
                 unknown_ip_list.append(target_ip)
 
+        ip_cc_list.append((target_ip, upd_cc))
         if sql_lines is not None:
             sql_line: str = FMT_SQL.format(upd_cc, target_ip)
             sql_lines.append(sql_line)
+    return ip_cc_list
+
+
+def load_checkpoint(checkpoint_file: str) -> int:
+    # 中断した場合は最後にコミットしたページの最終IPアドレス(数値)から再開する
+    if os.path.exists(checkpoint_file):
+        return int(fu.read_json(checkpoint_file)["last-ip-number"])
+    return -1
+
+
+def backfill_main(
+        db_pool: pgdatabase.PgDatabasePool,
+        resolver: CountryResolver,
+        page_size: int,
+        checkpoint_file: str,
+        dict_ip_network_cc: Optional[Dict[str, IpNetworkWithCC]],
+        unknown_ip_list: Optional[List[str]],
+        logger: logging.Logger, enable_debug: bool = False) -> None:
+    last_ip_number: int = load_checkpoint(checkpoint_file)
+    if last_ip_number >= 0:
+        logger.info(f"Resume from last_ip_number: {last_ip_number}")
+    total_updated: int = 0
+    page_no: int = 0
+    start_time: float = time.perf_counter()
+    while True:
+        # ページ毎にプールから接続 (ヘルスチェック・ステートメントタイムアウト適用済み) を取得し
+        #  正常終了でコミットしてから返却する
+        conn: connection
+        with db_pool.session() as conn:
+            # 国コードがNULLのレコードを次のページ分だけ取得
+            page: List[Tuple[int, str]] = get_null_cc_page(
+                conn, last_ip_number, page_size, logger=logger if enable_debug else None
+            )
+            if len(page) == 0:
+                break
+
+            target_ip_list: List[str] = [ip_addr for (_, ip_addr) in page]
+            match_list: List[Tuple[Optional[str], Optional[str]]] = resolver.resolve(
+                target_ip_list, conn=conn
+            )
+            ip_cc_list: List[Tuple[str, str]] = rir_table_matches_main(
+                target_ip_list, match_list, dict_ip_network_cc, unknown_ip_list, None,
+                logger, enable_debug
+            )
+            updated: int = bulk_update_country_code(
+                conn, ip_cc_list, logger=logger if enable_debug else None
+            )
+        # コミット後にチェックポイントを保存
+        page_no += 1
+        last_ip_number = page[-1][0]
+        fu.write_json(checkpoint_file, {"last-ip-number": last_ip_number})
+        total_updated += updated
+        elapsed: float = time.perf_counter() - start_time
+        logger.info(
+            f"page: {page_no}, updated: {total_updated}, last_ip_number: {last_ip_number}"
+            f", {total_updated / elapsed:.0f} rows/sec"
+        )
+
+    # 全件完了したらチェックポイントを削除
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    logger.info(
+        f"Backfill done. updated: {total_updated}"
+        f", elapsed: {time.perf_counter() - start_time:.3f} sec"
+    )
 
 
 def save_network_cc_dict(
         date_part: str, save_dir: str, dict_ip_network_cc: Dict[str, IpNetworkWithCC],
-        logger: logging.Logger) -> None:
+        country_names: Dict[str, str], logger: logging.Logger) -> None:
     file_name: str = f"ip_network_cc_with_hosts_{date_part}.txt"
     save_file: str = os.path.join(save_dir, file_name)
-    # 行形式: "ip_network","cc",["host1","host2",...]
+    # 行形式: "ip_network","cc","country_name",["host1","host2",...]
     net_cc_rec: IpNetworkWithCC
     net_cc_lines: List[str] = []
     for key in dict_ip_network_cc.keys():
         net_cc_rec = dict_ip_network_cc[key]
         line_hosts: str = '","'.join(net_cc_rec.ip_hosts)
-        line: str = f'"{key}","{net_cc_rec.country_code}",["{line_hosts}"]'
+        # マスタに存在しない国コードは空文字
+        cc_name: str = country_names.get(net_cc_rec.country_code, "")
+        line: str = (
+            f'"{key}","{net_cc_rec.country_code}","{cc_name}",["{line_hosts}"]'
+        )
         net_cc_lines.append(line)
     fu.write_text_lines(save_file, net_cc_lines)
     logger.info(f"Saved: {save_file}")
@@ -266,6 +453,36 @@ def export_main():
     # 不正アクセスIPマスタの国コード更新クエリーファイルを出力しない
     parser.add_argument("--no-output-sql", action="store_true",
                         help="No output country_code update SQL file.")
+    # 国コード更新SQLファイルを出力せずに直接テーブルを一括更新する場合は --no-output-sql と併用する
+    parser.add_argument("--apply", action="store_true",
+                        help="Update country_code in database.")
+    # RIRテーブルをメモリに読み込まずデータベース側の範囲インデックスで一括検索する
+    #  ※18_add_RIR_ip_number_range.sql 適用済みであること
+    parser.add_argument("--db-resolve", action="store_true",
+                        help="Resolve country code with RIR ip range index in database.")
+    # --db-resolve 指定時に割当範囲ではなく分割済みのCIDRブロックテーブルを検索する
+    #  ※21_create_RIR_ipv4_cidr.sql 適用済みで LoadRIRDelegated.py で登録済みであること
+    parser.add_argument("--cidr-table", action="store_true",
+                        help="Resolve with RIR_ipv4_cidr table with --db-resolve.")
+    # --db-resolve 指定時にターゲットIPリストを分割して並列検索するワーカー数
+    #  ※ワーカー数分の接続をプールするため max_connections を超えないこと
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Parallel workers with --db-resolve.")
+    # RIRテーブルの代わりに ExportRIRSnapshot.py で出力したスナップショットファイルで検索する
+    #  ※ファイル名省略時は conf/rir_snapshot.json の出力先
+    parser.add_argument("--snapshot", type=str, nargs="?", const="",
+                        help="Lookup with RIR snapshot file instead of RIR table.")
+    # IPネットワークと国コードの永続キャッシュを使用しない
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Disable CIDR country code cache.")
+    # 国コードがNULLの全レコードをページ単位で検索・更新・コミットする ※中断した場合は再開する
+    parser.add_argument("--backfill", action="store_true",
+                        help="Update all NULL country_code records page by page.")
+    # --backfill 時の1クエリーあたりのタイムアウト (秒) ※0はタイムアウトなし
+    parser.add_argument("--statement-timeout", type=int, default=300,
+                        help="Backfill statement timeout seconds. (0: no timeout)")
+    parser.add_argument("--page-size", type=int, default=1000,
+                        help="Backfill page size.")
     # fetch-limitが10件程度の場合に指定する ※大量のログが出力される
     parser.add_argument("--enable-debug", action="store_true",
                         help="Enable logger debug out.")
@@ -273,9 +490,23 @@ def export_main():
     fetch_limit: int = args.fetch_limit
     save_match_network: bool = args.save_match_network
     no_output_sql: bool = args.no_output_sql
+    db_resolve: bool = args.db_resolve
+    apply_update: bool = args.apply
+    backfill: bool = args.backfill
+    no_cache: bool = args.no_cache
+    workers: int = max(args.workers, 1)
+    if args.cidr_table and not db_resolve:
+        app_logger.warning("--cidr-table is effective only with --db-resolve.")
+    if db_resolve and args.snapshot is not None:
+        app_logger.warning("--snapshot is ignored with --db-resolve.")
+    if workers > 1 and not db_resolve:
+        # メモリ上の検索はデータベースの待ち時間がないため並列化しない
+        app_logger.warning("--workers is effective only with --db-resolve.")
     enable_debug: bool = args.enable_debug
     app_logger.info(
         f"fetch_limit: {fetch_limit},save_match_network: {save_match_network}"
+        f",db_resolve: {db_resolve},apply: {apply_update},backfill: {backfill}"
+        f",workers: {workers}"
     )
 
     # クエリーの出力先
@@ -297,34 +528,107 @@ def export_main():
         unknown_ip_list = None
     # 国コード更新用クエリー生成
     sql_lines: Optional[List[str]]
-    if not no_output_sql:
+    if not no_output_sql and not backfill:
         sql_lines = []
     else:
         sql_lines = None
 
+    # 国コードと国名 ※ネットワーク情報ファイル出力時のみ読み込む
+    country_names: Dict[str, str] = {}
     db: Optional[pgdatabase.PgDatabase] = None
+    db_pool: Optional[pgdatabase.PgDatabasePool] = None
+    cidr_cache: Optional[CidrCache] = None
+    resolver: Optional[CountryResolver] = None
+    snapshot: Optional[RirSnapshot] = None
     try:
+        if args.snapshot is not None and not db_resolve:
+            snapshot = RirSnapshot(os.path.expanduser(
+                args.snapshot if len(args.snapshot) > 0
+                else fu.read_json(SNAPSHOT_CONF_FILE)["snapshot-file"]
+            ))
+            app_logger.info(
+                f"RirSnapshot.size: {len(snapshot)}, loaded_at: {snapshot.rir_loaded_at}"
+            )
         db = pgdatabase.PgDatabase(DB_CONF_FILE, logger=app_logger)
         conn: connection = db.get_connection()
-        # 国コードがNULLのIPアドレスを取得 ※大量にログが出力されるためloggerにNoneを設定する
-        target_ip_list: List[str] = get_ip_list_with_null_cc(
-            conn, fetch_limit, logger=None
+        if dict_ip_network_cc is not None:
+            country_names = get_country_name_map(
+                conn, logger=app_logger if enable_debug else None
+            )
+        # IPネットワークと国コードの永続キャッシュ
+        if not no_cache:
+            if not os.path.exists(match_networks_dir):
+                os.makedirs(match_networks_dir)
+            cidr_cache = open_cidr_cache(db, match_networks_dir, snapshot, app_logger)
+        resolver = CountryResolver(
+            conn, db_resolve, cidr_cache=cidr_cache, workers=workers, rir_lookup=snapshot,
+            cidr_table=args.cidr_table, logger=app_logger if enable_debug else None
         )
-        target_ip_list_size: int = len(target_ip_list)
-        app_logger.info(f"target_ip_list.size: {target_ip_list_size}")
 
-        if target_ip_list_size > 0:
-            rir_table_matches_main(
-                conn, target_ip_list, dict_ip_network_cc, unknown_ip_list, sql_lines,
-                app_logger, enable_debug
+        if backfill:
+            # メモリ上で検索する場合はRIRテーブルを先に読み込み、読み込み用のトランザクションを終了する
+            #  ※"idle in transaction" のままだと参照テーブルのロックで洗い替え (TRUNCATE) を妨げる
+            if not db_resolve:
+                resolver.get_rir_lookup()
+            db.rollback()
+            # 長時間実行するため、ページ毎の更新はコネクションプールの接続で行う
+            db_pool = pgdatabase.PgDatabasePool(
+                DB_CONF_FILE, minconn=1, maxconn=1, application_name=APPLICATION_NAME,
+                statement_timeout_ms=(
+                    args.statement_timeout * 1000 if args.statement_timeout > 0 else None
+                ),
+                logger=app_logger if enable_debug else None
             )
+            backfill_main(
+                db_pool, resolver, args.page_size,
+                os.path.expanduser(conf["backfill-checkpoint"]),
+                dict_ip_network_cc, unknown_ip_list, app_logger, enable_debug
+            )
+        else:
+            # 国コードがNULLのIPアドレスを取得 ※大量にログが出力されるためloggerにNoneを設定する
+            target_ip_list: List[str] = get_ip_list_with_null_cc(
+                conn, fetch_limit, logger=None
+            )
+            target_ip_list_size: int = len(target_ip_list)
+            app_logger.info(f"target_ip_list.size: {target_ip_list_size}")
+
+            if target_ip_list_size > 0:
+                match_list: List[Tuple[Optional[str], Optional[str]]] = resolver.resolve(
+                    target_ip_list
+                )
+                ip_cc_list: List[Tuple[str, str]] = rir_table_matches_main(
+                    target_ip_list, match_list, dict_ip_network_cc, unknown_ip_list,
+                    sql_lines, app_logger, enable_debug
+                )
+                if apply_update:
+                    # 国コードを1トランザクション・1クエリで一括更新
+                    updated: int = bulk_update_country_code(
+                        conn, ip_cc_list, logger=app_logger if enable_debug else None
+                    )
+                    db.commit()
+                    app_logger.info(f"Updated country_code: {updated}")
     except psycopg2.Error as db_err:
+        if db is not None:
+            db.rollback()
         app_logger.error(db_err)
         exit(1)
     except Exception as err:
+        if db is not None:
+            db.rollback()
         app_logger.error(err)
         exit(1)
     finally:
+        # プリペアドステートメントの PREPARE 数と再利用数
+        app_logger.info(f"Prepared statements: {get_prepared_stats()}")
+        if resolver is not None:
+            resolver.close()
+        if snapshot is not None:
+            snapshot.close()
+        if cidr_cache is not None:
+            # 今回解決したネットワークを保存しヒット数を出力
+            cidr_cache.close()
+        if db_pool is not None:
+            db_pool.close()
         if db is not None:
             db.close()
 
@@ -332,7 +636,7 @@ def export_main():
     date_part: str = date.today().isoformat()
     if dict_ip_network_cc is not None and len(dict_ip_network_cc):
         save_network_cc_dict(
-            date_part, match_networks_dir, dict_ip_network_cc, app_logger
+            date_part, match_networks_dir, dict_ip_network_cc, country_names, app_logger
         )
     # 国コード不明リスト
     if unknown_ip_list is not None and len(unknown_ip_list) > 0:
@@ -0,0 +1,174 @@
+import argparse
+import glob
+import logging
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extensions import connection
+
+from db import pgdatabase
+from dao.rir_ipv4_allocated import (
+    get_registry_ids, copy_into_staging, replace_with_staging, insert_load_history
+)
+from dao.rir_ipv4_cidr import replace_cidr_table
+from extract.rir_delegated import read_ipv4_records
+import util.file_util as fu
+
+"""
+RIR(Regional Internet Registry)の割当状況ファイル (delegated-*-extended) から
+ipv4の割当レコードを抽出して RIR_ipv4_allocated テーブルを洗い替えするスクリプト
+※ファイルはダウンロード済みのローカルファイルのみを対象とする
+
+[処理手順]
+  1. 各レジストリのファイルを1行ずつ読み込み ipv4 の割当レコードのみ抽出
+  2. COPY FROM STDIN で一時テーブルに一括登録
+  3. 同一トランザクション内で RIR_ipv4_allocated を TRUNCATE し一時テーブルから一括登録
+     ※TRUNCATE のロックによりコミットするまで参照側のクエリは待たされる
+  4. 割当範囲をCIDRブロックに分割して RIR_ipv4_cidr を洗い替え ※21_create_RIR_ipv4_cidr.sql 適用済みであること
+  5. 洗い替え履歴テーブルに登録日時と件数を記録
+"""
+
+# ログフォーマット
+LOG_FMT: str = '%(levelname)s %(message)s'
+# データベース接続情報
+DB_CONF_FILE: str = os.path.join("conf", "db_conn.json")
+# 入力ファイル情報
+CONF_FILE: str = os.path.join("conf", "load_rir_delegated.json")
+# RIR_registory_mst に登録されているレジストリ名
+REGISTRY_NAMES: Tuple[str, ...] = ("apnic", "afrinic", "arin", "lacnic", "ripencc", "iana")
+# 割当状況ファイル名: delegated-{レジストリ}[-extended]-{YYYYmmdd|latest}[.gz|.xz|.zst]
+#  ※同じディレクトリのチェックサム (.md5) や署名 (.asc) ファイルは対象外
+FMT_DELEGATED_FILE: str = r"^delegated-{}-(?:extended-)?(?:\d{{8}}|latest)(?:\.gz|\.xz|\.zst)?$"
+
+
+def find_delegated_files(
+        data_dir: str, file_pattern: str, registry_names: List[str],
+        logger: logging.Logger) -> List[str]:
+    result: List[str] = []
+    for name in registry_names:
+        re_data_file: re.Pattern = re.compile(FMT_DELEGATED_FILE.format(name))
+        files: List[str] = sorted(
+            file_path for file_path in glob.glob(os.path.join(data_dir, file_pattern.format(name)))
+            if re_data_file.match(os.path.basename(file_path))
+        )
+        if len(files) > 0:
+            # 複数ある場合はファイル名の最後 (日付付きなら最新) を対象とする
+            result.append(files[-1])
+        else:
+            logger.warning(f"{name}: delegated file not found.")
+    return result
+
+
+def next_allocated_record(
+        file_list: List[str],
+        registry_ids: Dict[str, int],
+        counter: Counter,
+        logger: logging.Logger) -> Iterator[Tuple[str, int, str, str, int]]:
+    for file_path in file_list:
+        logger.info(f"Read: {file_path}")
+        for (registry, ip_start, cc, ip_count, allocated_date) in read_ipv4_records(file_path):
+            registry_id: Optional[int] = registry_ids.get(registry)
+            if registry_id is None:
+                # マスタに存在しないレジストリ
+                counter["unknown"] += 1
+                continue
+            counter[registry] += 1
+            yield ip_start, ip_count, cc, allocated_date, registry_id
+
+
+def batch_main():
+    logging.basicConfig(format=LOG_FMT)
+    app_logger = logging.getLogger(__name__)
+    app_logger.setLevel(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", type=str,
+                        help="delegated files directory.")
+    parser.add_argument("--registry", type=str, action="append",
+                        choices=REGISTRY_NAMES,
+                        help="Registry name. (default all)")
+    # ファイルの読み込みと抽出件数の表示のみ ※データベースに接続しない
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Parse files only.")
+    # CIDRブロックテーブル (RIR_ipv4_cidr) を洗い替えしない
+    parser.add_argument("--skip-cidr", action="store_true",
+                        help="Skip replacing RIR_ipv4_cidr.")
+    parser.add_argument("--enable-debug", action="store_true",
+                        help="Enable logger debug out.")
+    args: argparse.Namespace = parser.parse_args()
+    enable_debug: bool = args.enable_debug
+    if enable_debug:
+        app_logger.setLevel(level=logging.DEBUG)
+
+    conf: Dict[str, Any] = fu.read_json(CONF_FILE)
+    data_dir: str = os.path.expanduser(
+        args.data_dir if args.data_dir is not None else conf["data-dir"]
+    )
+    registry_names: List[str] = args.registry if args.registry else list(REGISTRY_NAMES)
+    app_logger.info(f"data_dir: {data_dir}, registry: {registry_names}")
+
+    file_list: List[str] = find_delegated_files(
+        data_dir, conf["file-pattern"], registry_names, app_logger
+    )
+    if len(file_list) == 0:
+        app_logger.error("No delegated files.")
+        exit(1)
+
+    counter: Counter = Counter()
+    start_time: float = time.perf_counter()
+    if args.dry_run:
+        # レジストリIDの代わりに連番を割り当てて抽出件数のみ集計
+        dummy_ids: Dict[str, int] = {name: i + 1 for i, name in enumerate(REGISTRY_NAMES)}
+        for _ in next_allocated_record(file_list, dummy_ids, counter, app_logger):
+            pass
+        app_logger.info(f"extracted: {dict(counter)}")
+        app_logger.info(f"elapsed: {time.perf_counter() - start_time:.3f} sec")
+        return
+
+    db: Optional[pgdatabase.PgDatabase] = None
+    try:
+        db = pgdatabase.PgDatabase(DB_CONF_FILE, logger=app_logger if enable_debug else None)
+        conn: connection = db.get_connection()
+        registry_ids: Dict[str, int] = get_registry_ids(conn, logger=None)
+        copied: int = copy_into_staging(
+            conn,
+            next_allocated_record(file_list, registry_ids, counter, app_logger),
+            logger=app_logger if enable_debug else None
+        )
+        app_logger.info(f"extracted: {dict(counter)}, copied: {copied}")
+        inserted: int = replace_with_staging(
+            conn, logger=app_logger if enable_debug else None
+        )
+        if not args.skip_cidr:
+            cidr_count: int = replace_cidr_table(
+                conn, logger=app_logger if enable_debug else None
+            )
+            app_logger.info(f"RIR_ipv4_cidr: {cidr_count} rows")
+        loaded_at: Optional[str] = insert_load_history(conn, inserted, logger=None)
+        # 洗い替えと履歴登録が正常終了したらコミット
+        db.commit()
+        elapsed: float = time.perf_counter() - start_time
+        app_logger.info(
+            f"RIR_ipv4_allocated: {inserted} rows, loaded_at: {loaded_at}"
+            f", elapsed: {elapsed:.3f} sec ({inserted / elapsed:.0f} rows/sec)"
+        )
+    except psycopg2.Error as db_err:
+        if db is not None:
+            db.rollback()
+        app_logger.error(db_err)
+        exit(1)
+    except Exception as exp:
+        if db is not None:
+            db.rollback()
+        app_logger.error(exp)
+        exit(1)
+    finally:
+        if db is not None:
+            db.close()
+
+
+if __name__ == '__main__':
+    batch_main()
@@ -0,0 +1,77 @@
+import argparse
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+from collections import Counter
+from io import BufferedIOBase
+from typing import Callable, Dict, List, Tuple
+
+from benchmark.bench_extractor import make_journal, measure
+from extract.extractor import count_ip_addr
+import util.file_util as fu
+
+"""
+圧縮ログファイル (gzip, xz, zstd) と非圧縮ログファイルの抽出速度 (MB/s) 計測
+extract/extractor.py の count_ip_addr で同じ合成 journal ログの各圧縮ファイルを読み込み比較する
+※MB/s は展開後のサイズで計算する, zstd は zstandard 未インストールの場合は省略
+
+[実行方法] ServerTools ディレクトリで実行
+  python3 -m benchmark.bench_compressed --size-mb 512
+"""
+
+
+def compress_file(src_path: str, dest_path: str,
+                  opener: Callable[[str], BufferedIOBase]) -> int:
+    with open(src_path, "rb") as src, opener(dest_path) as dest:
+        shutil.copyfileobj(src, dest, length=4 * 1024 * 1024)
+    return os.path.getsize(dest_path)
+
+
+def get_openers() -> Dict[str, Callable[[str], BufferedIOBase]]:
+    # 書き込みのみ計測対象外のため xz は高速なプリセットで圧縮する
+    openers: Dict[str, Callable[[str], BufferedIOBase]] = {
+        "gzip": lambda f: gzip.open(f, "wb", compresslevel=6),
+        "xz": lambda f: lzma.open(f, "wb", preset=1),
+    }
+    if fu.zstandard is not None:
+        openers["zstd"] = lambda f: fu.zstandard.open(f, "wb")
+    return openers
+
+
+def bench_main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=512,
+                        help="Synthetic journal size (MB).")
+    parser.add_argument("--ip-count", type=int, default=20000,
+                        help="Distinct IP addresses in journal.")
+    parser.add_argument("--work-dir", type=str, default=tempfile.gettempdir(),
+                        help="Synthetic journal directory.")
+    args: argparse.Namespace = parser.parse_args()
+
+    file_path: str = os.path.join(args.work_dir, "AuthFail_ssh_bench.log")
+    created: List[str] = [file_path]
+    try:
+        size: int = make_journal(file_path, args.size_mb, args.ip_count)
+        print(f"journal: {file_path}, size: {size / 1024 / 1024:.1f} MB")
+        compressed: List[Tuple[str, str]] = []
+        for compression, opener in get_openers().items():
+            comp_path: str = file_path + fu.COMPRESSION_SUFFIXES[compression]
+            created.append(comp_path)
+            comp_size: int = compress_file(file_path, comp_path, opener)
+            print(f"{compression:<8} {comp_size / 1024 / 1024:8.1f} MB  ratio: {size / comp_size:.1f}")
+            compressed.append((compression, comp_path))
+
+        plain: Counter = measure("plain", count_ip_addr, file_path, size)
+        for compression, comp_path in compressed:
+            counter: Counter = measure(compression, count_ip_addr, comp_path, size)
+            print(f"same result: {list(plain.items()) == list(counter.items())}")
+    finally:
+        for created_path in created:
+            if os.path.exists(created_path):
+                os.remove(created_path)
+
+
+if __name__ == '__main__':
+    bench_main()
@@ -0,0 +1,125 @@
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+from collections import Counter
+from typing import Callable, List, Optional
+
+from extract.extractor import count_ip_addr, count_ip_addr_parallel
+
+"""
+認証エラーログ抽出 (extract/extractor.py) の処理速度 (MB/s) 計測
+合成した journal ログファイルで、従来の行単位の正規表現とブロック単位のバイト列検索を比較する
+
+[実行方法] ServerTools ディレクトリで実行
+  python3 -m benchmark.bench_extractor --size-mb 2048
+"""
+
+# 従来の行全体の正規表現
+re_auth_fail_legacy: re.Pattern = re.compile(
+    r"^.+?rhost=([0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}).*$"
+)
+
+FMT_AUTH_FAIL: str = (
+    "2024-06-23T{:02d}:{:02d}:{:02d}+09:00 localhost.example sshd[{}]: pam_unix(sshd:auth):"
+    " authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost={}{}\n"
+)
+FMT_OTHER: str = (
+    "2024-06-23T{:02d}:{:02d}:{:02d}+09:00 localhost.example sshd[{}]:"
+    " Connection closed by authenticating user root {} port {} [preauth]\n"
+)
+# 合成ログを書き込む単位 (行数)
+BLOCK_LINES: int = 10000
+
+
+def make_block(ip_pool: List[str]) -> str:
+    lines: List[str] = []
+    for _ in range(BLOCK_LINES):
+        hh, mm, ss = random.randrange(24), random.randrange(60), random.randrange(60)
+        pid: int = random.randrange(1000, 99999)
+        ip: str = random.choice(ip_pool)
+        if random.random() < 0.1:
+            # 一致しない行
+            lines.append(FMT_OTHER.format(hh, mm, ss, pid, ip, random.randrange(1024, 65535)))
+        else:
+            user: str = random.choice(["", "  user=root", "  user=admin"])
+            lines.append(FMT_AUTH_FAIL.format(hh, mm, ss, pid, ip, user))
+    return "".join(lines)
+
+
+def make_journal(file_path: str, size_mb: int, ip_count: int) -> int:
+    ip_pool: List[str] = [
+        f"{random.randrange(1, 224)}.{random.randrange(256)}.{random.randrange(256)}"
+        f".{random.randrange(256)}" for _ in range(ip_count)
+    ]
+    blocks: List[bytes] = [make_block(ip_pool).encode("ascii") for _ in range(8)]
+    target_size: int = size_mb * 1024 * 1024
+    written: int = 0
+    with open(file_path, "wb") as fp:
+        while written < target_size:
+            block: bytes = random.choice(blocks)
+            fp.write(block)
+            written += len(block)
+    return written
+
+
+def count_legacy(file_path: str) -> Counter:
+    counter: Counter = Counter()
+    with open(file_path, "r") as fp:
+        for line in fp:
+            mat: Optional[re.Match] = re_auth_fail_legacy.search(line)
+            if mat:
+                counter[mat.group(1)] += 1
+    return counter
+
+
+def measure(title: str, func: Callable[[str], Counter], file_path: str, size: int) -> Counter:
+    start: float = time.perf_counter()
+    counter: Counter = func(file_path)
+    elapsed: float = time.perf_counter() - start
+    print(
+        f"{title:<8} {elapsed:8.2f} sec  {size / 1024 / 1024 / elapsed:8.1f} MB/s"
+        f"  matches: {sum(counter.values())}"
+    )
+    return counter
+
+
+def bench_main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=2048,
+                        help="Synthetic journal size (MB).")
+    parser.add_argument("--ip-count", type=int, default=20000,
+                        help="Distinct IP addresses in journal.")
+    parser.add_argument("--work-dir", type=str, default=tempfile.gettempdir(),
+                        help="Synthetic journal directory.")
+    # 並列処理 (--jobs) の計測を追加する
+    parser.add_argument("--jobs", type=int, default=0,
+                        help="Parallel parse processes. (0: skip)")
+    # 従来の正規表現は時間がかかるため省略できる
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="Skip legacy regex.")
+    args: argparse.Namespace = parser.parse_args()
+
+    file_path: str = os.path.join(args.work_dir, "AuthFail_ssh_bench.log")
+    try:
+        size: int = make_journal(file_path, args.size_mb, args.ip_count)
+        print(f"journal: {file_path}, size: {size / 1024 / 1024:.1f} MB")
+        counter: Counter = measure("block", count_ip_addr, file_path, size)
+        if args.jobs > 1:
+            jobs: int = args.jobs
+            parallel: Counter = measure(
+                f"jobs={jobs}", lambda f: count_ip_addr_parallel(f, jobs), file_path, size
+            )
+            print(f"same result: {list(counter.items()) == list(parallel.items())}")
+        if not args.skip_legacy:
+            legacy: Counter = measure("legacy", count_legacy, file_path, size)
+            print(f"same result: {counter == legacy}")
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+if __name__ == '__main__':
+    bench_main()
@@ -0,0 +1,92 @@
+import argparse
+import timeit
+from ipaddress import IPv4Address, ip_address
+from typing import Callable, List, Tuple
+
+import util.ipv4_codec as codec
+import util.ipv4_util as ipv4_u
+from extract.extractor import extract_ip_list
+
+"""
+IPv4コーデック (util/ipv4_codec.py) と ipaddress モジュールの処理時間比較
+実際のログファイルから抽出したIPアドレスで計測する
+
+[実行方法] ServerTools ディレクトリで実行
+  python3 -m benchmark.bench_ipv4_codec --log-file AuthFail_ssh_2024-06-23.log
+"""
+
+# 非2のべき乗の割当範囲 (例: ip_count=3072) でCIDR分割を計測する
+RANGE_BLOCK_SIZE: int = 4096
+RANGE_IP_COUNT: int = 3072
+
+
+def measure(func: Callable[[], object], repeat: int, number: int) -> float:
+    # 最小値 (秒) を採用する
+    return min(timeit.repeat(func, repeat=repeat, number=number))
+
+
+def print_result(title: str, count: int, ipaddr_sec: float, codec_sec: float) -> None:
+    print(
+        f"{title:<14} ipaddress: {ipaddr_sec * 1e9 / count:8.1f} ns/ip"
+        f"  codec: {codec_sec * 1e9 / count:8.1f} ns/ip"
+        f"  speed-up: x{ipaddr_sec / codec_sec:.1f}"
+    )
+
+
+def bench_main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log-file", type=str, required=True,
+                        help="AuthFail ssh log file.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Repeat count.")
+    parser.add_argument("--number", type=int, default=10,
+                        help="Loop count per repeat.")
+    args: argparse.Namespace = parser.parse_args()
+    ip_list: List[str] = extract_ip_list(args.log_file)
+    if len(ip_list) == 0:
+        print("No IP address in log file.")
+        exit(1)
+    repeat: int = args.repeat
+    number: int = args.number
+    count: int = len(ip_list) * number
+    print(f"ip_list.size: {len(ip_list)}, unique: {len(set(ip_list))}")
+
+    # 文字列 -> 数値
+    print_result(
+        "str -> int", count,
+        measure(lambda: [int(ip_address(ip)) for ip in ip_list], repeat, number),
+        measure(lambda: [codec.ip_to_int(ip) for ip in ip_list], repeat, number)
+    )
+    ip_numbers: List[int] = [codec.ip_to_int(ip) for ip in ip_list]
+    # 数値 -> 文字列
+    print_result(
+        "int -> str", count,
+        measure(lambda: [str(IPv4Address(num)) for num in ip_numbers], repeat, number),
+        measure(lambda: [codec.int_to_ip(num) for num in ip_numbers], repeat, number)
+    )
+    # 割当範囲のCIDR分割とターゲットIPを含むネットワークの検索
+    ranges: List[Tuple[int, int, int]] = []
+    for num in ip_numbers:
+        ip_first: int = num & ~(RANGE_BLOCK_SIZE - 1)
+        ranges.append((ip_first, ip_first + RANGE_IP_COUNT - 1, num))
+
+    def detect_with_ipaddress() -> None:
+        for (ip_first, ip_last, num) in ranges:
+            cidr_cc_list = ipv4_u.get_cidr_cc_list(
+                str(IPv4Address(ip_first)), ip_last - ip_first + 1, "--"
+            )
+            ipv4_u.detect_cc_in_cidr_cc_list(str(IPv4Address(num)), cidr_cc_list)
+
+    def detect_with_codec() -> None:
+        for (ip_first, ip_last, num) in ranges:
+            codec.get_cidr_in_range(ip_first, ip_last, num)
+
+    print_result(
+        "cidr in range", count,
+        measure(detect_with_ipaddress, repeat, number),
+        measure(detect_with_codec, repeat, number)
+    )
+
+
+if __name__ == '__main__':
+    bench_main()
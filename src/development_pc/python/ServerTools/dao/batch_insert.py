@@ -0,0 +1,151 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from psycopg2.extensions import connection
+
+from dao.record.tabledata import AuthErrorCount, SshAuthError
+# unauth_ip_addr テーブル
+from dao.unauth_ip_addr import (
+    bulk_exists_ip_addr,
+    bulk_upsert_with_fetch as bulk_upsert_into_unauth_ip_addr,
+    bulk_copy_insert_with_fetch as bulk_copy_into_unauth_ip_addr
+)
+# ssh_auth_error テーブル
+from dao.ssh_auth_error import (
+    bulk_upsert_with_nofetch as bulk_upsert_into_ssh_auth_error,
+    bulk_copy_insert_with_nofetch as bulk_copy_into_ssh_auth_error
+)
+
+"""
+不正アクセスカウンターレコードを2つのテーブルに一括登録する関数モジュール
+※コミット・ロールバックは呼び出し側で行う
+[スキーマ] mainte
+[テーブル]
+  (1) 不正アクセスIPアドレステーブル
+     unauth_ip_addr
+  (2) 不正アクセスエラーカウントテーブル
+     ssh_auth_error
+※どちらのテーブルも ON CONFLICT DO NOTHING で登録するため同一CSVを再実行しても重複登録しない
+※複数日のレコードを渡した場合もIPアドレスの登録は1回で行う
+"""
+
+# execute_values() の1文あたりのレコード数
+INSERT_PAGE_SIZE: int = 1000
+# このレコード数を超えたら COPY + INSERT ... SELECT で登録する
+COPY_THRESHOLD: int = 5000
+
+
+def get_register_ip_list(records: List[AuthErrorCount]) -> List[Tuple[str, str]]:
+    # 複数日のレコードで同一IPアドレスは最初に出現した日付で1件のみ登録する
+    ip_reg_date: Dict[str, str] = OrderedDict()
+    for rec in records:
+        if rec.ip_addr not in ip_reg_date:
+            ip_reg_date[rec.ip_addr] = rec.log_date
+    return list(ip_reg_date.items())
+
+
+def get_register_ssh_auth_error_list(
+        ip_id_dict: Dict[str, int],
+        records: List[AuthErrorCount],
+        logger: Optional[logging.Logger] = None) -> List[SshAuthError]:
+    result: List[SshAuthError] = []
+    for rec in records:
+        ip_id: Optional[int] = ip_id_dict.get(rec.ip_addr)
+        if ip_id is not None:
+            #  当該日のIPアドレスは不正アクセスIPアドレステーブルに登録済み
+            result.append(
+                SshAuthError(
+                    log_date=rec.log_date, ip_id=ip_id, appear_count=rec.appear_count
+                )
+            )
+        else:
+            # このケースはない想定
+            if logger is not None:
+                logger.warning(f"{rec.ip_addr} is not regstered!")
+    return result
+
+
+def upsert_unauth_ip_main(
+        conn: connection,
+        reg_ip_list: List[Tuple[str, str]],
+        logger: Optional[logging.Logger] = None, enable_debug=False) -> Dict[str, int]:
+    # 戻り値: 登録済み + 新規登録のIPアドレスをキーとするIPのIDの辞書
+    ip_id_dict: Dict[str, int]
+    if len(reg_ip_list) > COPY_THRESHOLD:
+        ip_id_dict = bulk_copy_into_unauth_ip_addr(
+            conn, reg_ip_list, logger=logger if enable_debug else None
+        )
+    else:
+        ip_id_dict = bulk_upsert_into_unauth_ip_addr(
+            conn, reg_ip_list, logger=logger if enable_debug else None,
+            page_size=INSERT_PAGE_SIZE
+        )
+    # 他のトランザクションが同時に登録したIPアドレスはスナップショットに含まれないため再取得する
+    missing_ip_list: List[str] = [ip for (ip, _) in reg_ip_list if ip not in ip_id_dict]
+    if len(missing_ip_list) > 0:
+        if logger is not None:
+            logger.info(f"Concurrently registered: {len(missing_ip_list)}")
+        ip_id_dict.update(bulk_exists_ip_addr(conn, missing_ip_list, logger=logger))
+    if logger is not None:
+        logger.info(f"ip_id_dict.size: {len(ip_id_dict)}")
+        if enable_debug:
+            logger.debug(f"ip_id_dict: {ip_id_dict}")
+    return ip_id_dict
+
+
+def upsert_ssh_auth_error_main(
+        conn: connection,
+        ssh_auth_error_list: List[SshAuthError],
+        logger: Optional[logging.Logger] = None, enable_debug=False) -> int:
+    # 当該日にIP_IDが登録済みのレコードは登録しない ※誤って同一CSVを実行した場合を想定
+    records: List[Tuple[str, int, int]] = [
+        (rec.log_date, rec.ip_id, rec.appear_count) for rec in ssh_auth_error_list
+    ]
+    inserted: int
+    if len(records) > COPY_THRESHOLD:
+        # 全日付分をまとめて COPY で登録
+        inserted = bulk_copy_into_ssh_auth_error(
+            conn, records, logger=logger if enable_debug else None
+        )
+    else:
+        # 全日付分をまとめて登録
+        inserted = bulk_upsert_into_ssh_auth_error(
+            conn, records, logger=logger if enable_debug else None,
+            page_size=INSERT_PAGE_SIZE
+        )
+    if logger is not None:
+        if inserted < len(records):
+            logger.info(f"ssh_auth_error registered: {len(records) - inserted}")
+    return inserted
+
+
+def register_main(
+        conn: connection,
+        records: List[AuthErrorCount],
+        logger: Optional[logging.Logger] = None, enable_debug=False) -> int:
+    # 戻り値: ssh_auth_error テーブルの登録件数
+    # 不正アクセスIPアドレステーブルに登録し、登録済みを含む全IPアドレスのIDを取得
+    reg_ip_list: List[Tuple[str, str]] = get_register_ip_list(records)
+    if logger is not None:
+        logger.info(f"reg_ip_list.size: {len(reg_ip_list)}")
+    ip_id_dict: Dict[str, int] = upsert_unauth_ip_main(
+        conn, reg_ip_list, logger=logger, enable_debug=enable_debug
+    )
+
+    # 不正アクセスカウンターテーブル登録用リスト
+    ssh_auth_error_list: List[SshAuthError] = get_register_ssh_auth_error_list(
+        ip_id_dict, records, logger=logger
+    )
+    if logger is not None:
+        logger.info(
+            f"Register ssh_auth_error_list.size: {len(ssh_auth_error_list)}"
+        )
+
+    # 不正アクセスカウンターテーブルに新規
+    if len(ssh_auth_error_list) > 0:
+        return upsert_ssh_auth_error_main(
+            conn, ssh_auth_error_list,
+            logger=logger, enable_debug=enable_debug
+        )
+    return 0
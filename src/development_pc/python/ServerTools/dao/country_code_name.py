@@ -0,0 +1,43 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extensions import connection, cursor
+
+"""
+国コードマスタ (country_code_name_mst) 検索モジュール
+マスタは固定の約200件のため初回に全件を読み込んでメモリ上に保持し、以降はデータベースに問い合わせない
+※マスタを更新した場合は refresh_country_name_map() で再読み込みする
+"""
+
+QRY_ALL_NAMES: str = """
+SELECT country_code,japanese_name FROM mainte.country_code_name_mst"""
+
+# 国コード -> 和名国名 ※未読み込みの場合は None
+_country_name_map: Optional[Dict[str, str]] = None
+
+
+def refresh_country_name_map(
+        conn: connection,
+        logger: Optional[logging.Logger] = None) -> Dict[str, str]:
+    global _country_name_map
+    try:
+        cur: cursor
+        with conn.cursor() as cur:
+            cur.execute(QRY_ALL_NAMES)
+            rows: List[Tuple[str, str]] = cur.fetchall()
+            if logger is not None:
+                logger.debug(f"country_code_name_mst.size: {len(rows)}")
+        _country_name_map = {cc: name for (cc, name) in rows}
+        return _country_name_map
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
+
+
+def get_country_name_map(
+        conn: connection,
+        logger: Optional[logging.Logger] = None) -> Dict[str, str]:
+    if _country_name_map is None:
+        return refresh_country_name_map(conn, logger=logger)
+    return _country_name_map
+
@@ -0,0 +1,79 @@
+import weakref
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Set, Tuple
+
+import psycopg2
+from psycopg2.extensions import connection, cursor, TRANSACTION_STATUS_IDLE
+
+"""
+頻繁に実行する検索クエリーのプリペアドステートメント管理モジュール
+接続毎に1回だけ PREPARE し、以降は EXECUTE で実行することでサーバー側の解析・実行計画作成を省く
+※DISCARD ALL 等でサーバー側から削除されていた場合は再度 PREPARE する
+  (呼び出し側のトランザクション外の実行であれば1回だけ再実行する)
+"""
+
+
+@dataclass(frozen=True)
+class PreparedQuery:
+    name: str
+    param_types: Tuple[str, ...]
+    # パラメータは $1, $2, ... で記述する
+    query: str
+
+
+# 接続毎の PREPARE 済みステートメント名
+#  ※接続オブジェクトの弱参照をキーとするため、接続が破棄されるとエントリも削除される
+_prepared_names: "weakref.WeakKeyDictionary[connection, Set[str]]" = weakref.WeakKeyDictionary()
+# 実行カウンター: prepared = PREPARE 実行数, hits = PREPARE 済みステートメントの実行数
+#  retried = サーバー側で削除されていたため再 PREPARE した数
+_stats: Counter = Counter()
+
+
+def _get_prepared_names(conn: connection) -> Set[str]:
+    names: Set[str] = _prepared_names.get(conn, set())
+    _prepared_names[conn] = names
+    return names
+
+
+def _prepare(cur: cursor, stmt: PreparedQuery, names: Set[str]) -> None:
+    cur.execute(
+        f"PREPARE {stmt.name} ({','.join(stmt.param_types)}) AS {stmt.query}"
+    )
+    names.add(stmt.name)
+    _stats["prepared"] += 1
+
+
+def execute_prepared(cur: cursor, stmt: PreparedQuery, params: Tuple[Any, ...]) -> None:
+    conn: connection = cur.connection
+    names: Set[str] = _get_prepared_names(conn)
+    # このクエリーでトランザクションを開始するか ※クライアント側の状態のためサーバーへの問い合わせはない
+    starts_transaction: bool = (
+        conn.autocommit or conn.info.transaction_status == TRANSACTION_STATUS_IDLE
+    )
+    if stmt.name not in names:
+        _prepare(cur, stmt, names)
+    else:
+        _stats["hits"] += 1
+    placeholders: str = ",".join(["%s"] * len(params))
+    qry_execute: str = f"EXECUTE {stmt.name} ({placeholders})"
+    try:
+        cur.execute(qry_execute, params)
+    except psycopg2.errors.InvalidSqlStatementName as err:
+        # サーバー側で削除済み: 全ステートメントを未 PREPARE とする
+        names.clear()
+        if not starts_transaction:
+            # 呼び出し側のトランザクション内の実行済みクエリーは取り消せないため呼び出し側で再実行する
+            raise err
+        if not conn.autocommit:
+            # このクエリーで開始したトランザクションのため取り消すクエリーはない
+            conn.rollback()
+        _prepare(cur, stmt, names)
+        _stats["retried"] += 1
+        cur.execute(qry_execute, params)
+
+
+def get_stats() -> Dict[str, int]:
+    return {
+        "prepared": _stats["prepared"], "hits": _stats["hits"], "retried": _stats["retried"]
+    }
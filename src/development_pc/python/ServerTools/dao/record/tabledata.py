@@ -25,3 +25,11 @@ class SshAuthError:
     log_date: str
     ip_id: int
     appear_count: int
+
+
+# 不正アクセスカウンターCSVの1レコード: "log_date","ip_addr",appear_count
+@dataclass(frozen=True)
+class AuthErrorCount:
+    log_date: str
+    ip_addr: str
+    appear_count: int
@@ -1,28 +1,86 @@
 import logging
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import psycopg2
 from psycopg2.extensions import connection, cursor
 
+from dao.prepared import PreparedQuery, execute_prepared
+from util.copy_util import IteratorReader, to_copy_line
+
 """
 RIR (Regional Internet Registry) の 各国割り当てIPアドレス情報からIpv4アドレスの割当済みデータを
-登録したテーブルから指定したIPアドレスに後方部分一致したレコードを取得する
+登録したテーブルの検索と洗い替え
 """
 
-# LIKE検索では呼び出し側でクエリーパラメータに "%" を付与すること
-QRY_IP_LIKE: str = """
+# 全件取得クエリー ※ソートは呼び出し側で数値変換後に行う
+QRY_ALL_RECORDS: str = """
 SELECT
    ip_start,ip_count,country_code
 FROM
-   mainte.RIR_ipv4_allocated
-WHERE
-   ip_start LIKE %(partial_match)s
+   mainte.RIR_ipv4_allocated"""
+
+# IPアドレス(数値)の配列に一致する割当レコードを1回のクエリで取得する
+#  ※18_add_RIR_ip_number_range.sql で追加した ip_start_num のインデックスを使用
+PREPARED_BULK_MATCH_IP_NUMBER: PreparedQuery = PreparedQuery(
+    name="rir_bulk_match_ip_number",
+    param_types=("BIGINT[]",),
+    query="""
+SELECT
+   t.ip_number, rir.ip_start, rir.ip_count, rir.country_code
+FROM
+   unnest($1) AS t(ip_number)
+   INNER JOIN LATERAL (
+      SELECT
+         ip_start, ip_count, ip_end_num, country_code
+      FROM
+         mainte.RIR_ipv4_allocated
+      WHERE
+         ip_start_num <= t.ip_number
+      ORDER BY
+         ip_start_num DESC
+      LIMIT 1
+   ) rir ON rir.ip_end_num >= t.ip_number"""
+)
+
+# レジストリ名とIDのマスタ
+QRY_REGISTRY_MST: str = """
+SELECT id,name FROM mainte.RIR_registory_mst"""
+
+# 洗い替え用の一時テーブル ※トランザクション終了で削除
+QRY_CREATE_STAGING: str = """
+CREATE TEMP TABLE rir_ipv4_staging(
+   ip_start VARCHAR(15) NOT NULL,
+   ip_count INTEGER NOT NULL,
+   country_code CHAR(2) NOT NULL,
+   allocated_date DATE NOT NULL,
+   registry_id SMALLINT NOT NULL
+) ON COMMIT DROP"""
+
+QRY_COPY_STAGING: str = """
+COPY rir_ipv4_staging(ip_start,ip_count,country_code,allocated_date,registry_id)
+ FROM STDIN"""
+
+# 同一開始IPが複数のレジストリに存在する場合はレジストリIDの小さい方を優先する
+#  ※TRUNCATE は ACCESS EXCLUSIVE ロックを取得するため、参照側はコミットまで待たされる
+#    (空のテーブルや登録途中のデータが参照されることはない)
+QRY_REPLACE_WITH_STAGING: str = """
+INSERT INTO mainte.RIR_ipv4_allocated(
+   ip_start,ip_count,country_code,allocated_date,registry_id
+)
+SELECT DISTINCT ON (ip_start)
+   ip_start,ip_count,country_code,allocated_date,registry_id
+FROM
+   rir_ipv4_staging
 ORDER BY
- LPAD(SPLIT_PART(ip_start,'.',1), 3, '0') || '.' ||
- LPAD(SPLIT_PART(ip_start,'.',2), 3, '0') || '.' ||
- LPAD(SPLIT_PART(ip_start,'.',3), 3, '0') || '.' ||
- LPAD(SPLIT_PART(ip_start,'.',4), 3, '0')"""
+   ip_start, registry_id"""
+
+QRY_INSERT_LOAD_HISTORY: str = """
+INSERT INTO mainte.RIR_ipv4_load_history(record_count) VALUES (%(record_count)s)
+ RETURNING loaded_at"""
+
+QRY_LAST_LOADED_AT: str = """
+SELECT max(loaded_at) FROM mainte.RIR_ipv4_load_history"""
 
 
 @dataclass(frozen=True)
@@ -32,41 +90,123 @@ class RirRecord:
     country_code: str
 
 
-def make_like_ip(like_old: str) -> Optional[str]:
-    # 末尾の likeプレースホルダを削除する
-    raw_ip: str = like_old.replace(".%", "")
-    fields: List[str] = raw_ip.split(".")
-    # コンマで区切って残りが1つなら終了
-    field_size: int = len(fields)
-    if field_size == 1:
-        return None
-
-    # フィールドを1つ減らす
-    del fields[field_size - 1]
-    # 末尾にlikeプレースホルダ(".%")を付加して終了
-    return ".".join(fields) + ".%"
+def get_all_records(
+        con: connection,
+        logger: Optional[logging.Logger] = None) -> List[Tuple[str, int, str]]:
+    try:
+        cur: cursor
+        with con.cursor() as cur:
+            cur.execute(QRY_ALL_RECORDS)
+            rows: List[Tuple[str, int, str]] = cur.fetchall()
+            if logger is not None:
+                logger.debug(f"rows.size: {len(rows)}")
+        return rows
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
 
 
-def get_rir_table_matches(
+def bulk_get_matches_with_ip_number(
         con: connection,
-        qry_params: str,
-        logger: Optional[logging.Logger] = None) -> List[Tuple[str, int, str]]:
-    if logger is not None:
-        logger.debug(f"qry_params: {qry_params}")
-    result: List[Tuple[str, int, str]]
+        ip_number_list: List[int],
+        logger: Optional[logging.Logger] = None) -> Dict[int, RirRecord]:
     try:
         cur: cursor
         with con.cursor() as cur:
-            cur.execute(QRY_IP_LIKE, ({'partial_match': qry_params}))
-            # レコード取得件数チェック
-            if cur.rowcount > 0:
-                rows: List[Tuple[str, int, str]] = cur.fetchall()
-                if logger is not None:
-                    logger.debug(f"rows: {rows}")
-                result = rows
-            else:
-                # マッチしなかったら空のリスト
-                result = []
+            execute_prepared(cur, PREPARED_BULK_MATCH_IP_NUMBER, (ip_number_list,))
+            rows: List[Tuple[int, str, int, str]] = cur.fetchall()
+            if logger is not None:
+                logger.debug(f"rows.size: {len(rows)}")
+        # 戻り値: IPアドレス(数値)をキーとする割当レコードの辞書 ※一致しないIPは含まない
+        result: Dict[int, RirRecord] = {
+            ip_number: RirRecord(ip_start=ip_start, ip_count=ip_count, country_code=cc)
+            for (ip_number, ip_start, ip_count, cc) in rows
+        }
         return result
     except (Exception, psycopg2.DatabaseError) as err:
         raise err
+
+
+def get_registry_ids(
+        con: connection,
+        logger: Optional[logging.Logger] = None) -> Dict[str, int]:
+    try:
+        cur: cursor
+        with con.cursor() as cur:
+            cur.execute(QRY_REGISTRY_MST)
+            rows: List[Tuple[int, str]] = cur.fetchall()
+            if logger is not None:
+                logger.debug(f"rows: {rows}")
+        # 戻り値: レジストリ名をキーとするIDの辞書
+        return {name: reg_id for (reg_id, name) in rows}
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
+
+
+def copy_into_staging(
+        con: connection,
+        records: Iterable[Tuple[str, int, str, str, int]],
+        logger: Optional[logging.Logger] = None) -> int:
+    # records: (ip_start, ip_count, country_code, allocated_date, registry_id)
+    try:
+        cur: cursor
+        with con.cursor() as cur:
+            cur.execute(QRY_CREATE_STAGING)
+            # レコードを1行ずつ COPY テキスト形式に変換しながら送信する
+            cur.copy_expert(
+                QRY_COPY_STAGING,
+                IteratorReader(to_copy_line(*rec) for rec in records)
+            )
+            copied: int = cur.rowcount
+            if logger is not None:
+                logger.debug(f"copied: {copied}")
+        return copied
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
+
+
+def replace_with_staging(
+        con: connection,
+        logger: Optional[logging.Logger] = None) -> int:
+    try:
+        cur: cursor
+        with con.cursor() as cur:
+            cur.execute("TRUNCATE mainte.RIR_ipv4_allocated")
+            cur.execute(QRY_REPLACE_WITH_STAGING)
+            inserted: int = cur.rowcount
+            if logger is not None:
+                logger.debug(f"inserted: {inserted}")
+        return inserted
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
+
+
+def insert_load_history(
+        con: connection,
+        record_count: int,
+        logger: Optional[logging.Logger] = None) -> Optional[str]:
+    try:
+        cur: cursor
+        with con.cursor() as cur:
+            cur.execute(QRY_INSERT_LOAD_HISTORY, {"record_count": record_count})
+            row: Optional[Tuple] = cur.fetchone()
+            if logger is not None:
+                logger.debug(f"row: {row}")
+        return str(row[0]) if row is not None else None
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
+
+
+def get_last_loaded_at(
+        con: connection,
+        logger: Optional[logging.Logger] = None) -> Optional[str]:
+    try:
+        cur: cursor
+        with con.cursor() as cur:
+            cur.execute(QRY_LAST_LOADED_AT)
+            row: Optional[Tuple] = cur.fetchone()
+            if logger is not None:
+                logger.debug(f"row: {row}")
+        # 洗い替え履歴がない場合は None
+        return str(row[0]) if row is not None and row[0] is not None else None
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
@@ -0,0 +1,92 @@
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extensions import connection, cursor
+
+from dao.prepared import PreparedQuery, execute_prepared
+import util.ipv4_codec as codec
+from util.copy_util import IteratorReader, to_copy_line
+
+"""
+RIR_ipv4_allocated の割当範囲をCIDRブロックに分割したテーブル (RIR_ipv4_cidr) の登録と検索
+※21_create_RIR_ipv4_cidr.sql 適用済みであること
+"""
+
+# 洗い替え後の割当範囲 ※同一トランザクション内で参照する
+QRY_ALLOCATED_RANGES: str = """
+SELECT
+   ip_start,ip_start_num,ip_end_num,country_code
+FROM
+   mainte.RIR_ipv4_allocated"""
+
+QRY_COPY_CIDR: str = """
+COPY mainte.RIR_ipv4_cidr(cidr,ip_start,country_code) FROM STDIN"""
+
+# IPアドレスの配列に一致するCIDRブロックを1回のクエリで取得する
+#  ※ブロックは重複しないため GiST インデックスの包含検索で1件のみ一致する
+PREPARED_BULK_MATCH_CIDR: PreparedQuery = PreparedQuery(
+    name="rir_bulk_match_cidr",
+    param_types=("TEXT[]",),
+    query="""
+SELECT
+   t.ip_addr, c.cidr::TEXT, c.country_code
+FROM
+   unnest($1) AS t(ip_addr)
+   INNER JOIN LATERAL (
+      SELECT
+         cidr, country_code
+      FROM
+         mainte.RIR_ipv4_cidr
+      WHERE
+         cidr >>= t.ip_addr::INET
+      LIMIT 1
+   ) c ON TRUE"""
+)
+
+
+def next_cidr_record(
+        ranges: List[Tuple[str, int, int, str]]) -> Iterator[Tuple[str, str, str]]:
+    # 割当範囲をCIDRブロックに分割する: (CIDR, 開始IP, 国コード)
+    for (ip_start, ip_start_num, ip_end_num, cc) in ranges:
+        for network, prefix_len in codec.range_to_cidrs(ip_start_num, ip_end_num):
+            yield codec.to_cidr(network, prefix_len), ip_start, cc
+
+
+def replace_cidr_table(
+        con: connection,
+        logger: Optional[logging.Logger] = None) -> int:
+    # RIR_ipv4_allocated の洗い替えと同一トランザクションで実行すること
+    try:
+        cur: cursor
+        with con.cursor() as cur:
+            cur.execute(QRY_ALLOCATED_RANGES)
+            ranges: List[Tuple[str, int, int, str]] = cur.fetchall()
+            cur.execute("TRUNCATE mainte.RIR_ipv4_cidr")
+            cur.copy_expert(
+                QRY_COPY_CIDR,
+                IteratorReader(to_copy_line(*rec) for rec in next_cidr_record(ranges))
+            )
+            copied: int = cur.rowcount
+            if logger is not None:
+                logger.debug(f"ranges: {len(ranges)}, cidr: {copied}")
+        return copied
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
+
+
+def bulk_get_cidr_matches(
+        con: connection,
+        ip_list: List[str],
+        logger: Optional[logging.Logger] = None) -> Dict[str, Tuple[str, str]]:
+    try:
+        cur: cursor
+        with con.cursor() as cur:
+            execute_prepared(cur, PREPARED_BULK_MATCH_CIDR, (ip_list,))
+            rows: List[Tuple[str, str, str]] = cur.fetchall()
+            if logger is not None:
+                logger.debug(f"rows.size: {len(rows)}")
+        # 戻り値: IPアドレスをキーとする (CIDR, 国コード) の辞書 ※一致しないIPは含まない
+        return {ip_addr: (cidr, cc) for (ip_addr, cidr, cc) in rows}
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
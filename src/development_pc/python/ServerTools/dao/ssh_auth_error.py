@@ -1,119 +1,85 @@
 from logging import Logger
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Iterable, List, Optional, Tuple
 
 import psycopg2
 from psycopg2.extensions import connection, cursor
 from psycopg2.extras import execute_values
 
+from util.copy_util import IteratorReader, to_copy_line
+
 """
 不正アクセスカウンターテーブルDB操作関数モジュール
 [スキーマ] mainte
 [対象テーブル] ssh_auth_error
 """
 
-# 主キーレコード検索クエリ: log_date and ip_addrリスト
-QRY_EXISTS_REC_JOINED: str = """
-SELECT
-   ip_addr, ip_id
-FROM
-   mainte.ssh_auth_error sae
-   INNER JOIN mainte.unauth_ip_addr uia ON uia.id = sae.ip_id
-WHERE
-   log_date = %(log_date)s AND ip_addr IN %(in_clause)s"""
-
-# 主キーレコード検索クエリ: log_date and ip_idリスト
-QRY_EXISTS_REC: str = """
-SELECT
-   ip_id
-FROM
-   mainte.ssh_auth_error
-WHERE
-   log_date = %(log_date)s AND ip_id IN %(in_clause)s"""
+# 冪等なバッチ登録クエリー ※主キーが登録済みのレコードは登録しない
+QRY_UPSERT_WITH_RETURN: str = """
+INSERT INTO mainte.ssh_auth_error(log_date, ip_id, appear_count) VALUES %s
+ON CONFLICT ON CONSTRAINT pk_ssh_auth_error DO NOTHING
+RETURNING ip_id"""
 
-# バッチ登録クエリー ※戻り値なし
-QRY_INSERT_WITH_NO_RETURN: str = """
-INSERT INTO mainte.ssh_auth_error(log_date, ip_id, appear_count) VALUES %s"""
-# バッチ登録クエリー時のパラメータ生成用のテンプレート
-VALUES_TEMPLATE: str = "(%(log_date)s, %(ip_id)s, %(appear_count)s)"
+# COPY 登録用の一時テーブル
+QRY_CREATE_COPY_TEMP: str = """
+CREATE TEMP TABLE IF NOT EXISTS tmp_ssh_auth_error(
+   log_date DATE NOT NULL,
+   ip_id INTEGER NOT NULL,
+   appear_count INTEGER NOT NULL
+) ON COMMIT DROP"""
 
+QRY_COPY_TEMP: str = """
+COPY tmp_ssh_auth_error(log_date, ip_id, appear_count) FROM STDIN"""
 
-# ログ採取日のIPアドレスリストが登録済みかチェックする
-def bulk_exists_record_with_joined(
-        conn: connection,
-        log_date: str,
-        ip_list: List[str],
-        logger: Optional[Logger] = None) -> Dict[str, int]:
-    # IN ( in_clause )
-    in_clause: Tuple[str, ...] = tuple(ip_list, )
-    try:
-        cur: cursor
-        with conn.cursor() as cur:
-            cur.execute(
-                QRY_EXISTS_REC_JOINED, {"log_date": log_date, "in_clause": in_clause}
-            )
-            # 実行されたSQLを出力
-            if logger is not None:
-                if cur.query is not None:
-                    logger.debug(f"{cur.query.decode('utf-8')}")
-            # 戻り値を取得する
-            # def fetchall(self) -> list[tuple[Any, ...]]
-            rows: List[Tuple[Any, ...]] = cur.fetchall()
-            if logger is not None:
-                logger.debug(f"rows: {rows}")
-
-            result_dict: Dict[str, int] = {ip_addr: ip_id for (ip_id, ip_addr) in rows}
-            return result_dict
-    except (Exception, psycopg2.DatabaseError) as err:
-        raise err
+QRY_INSERT_FROM_COPY_TEMP: str = """
+INSERT INTO mainte.ssh_auth_error(log_date, ip_id, appear_count)
+SELECT log_date, ip_id, appear_count FROM tmp_ssh_auth_error
+ON CONFLICT ON CONSTRAINT pk_ssh_auth_error DO NOTHING"""
 
 
-def bulk_exists_record(
+# COPY で一時テーブルに登録してから INSERT ... SELECT する ※大量レコード用
+def bulk_copy_insert_with_nofetch(
         conn: connection,
-        log_date: str,
-        ipid_list: List[int],
-        logger: Optional[Logger] = None) -> List[int]:
-    # IN ( in_clause )
-    in_clause: Tuple[int, ...] = tuple(ipid_list, )
+        records: Iterable[Tuple[str, int, int]],
+        logger: Optional[Logger] = None) -> int:
+    # records: (log_date, ip_id, appear_count)
     try:
         cur: cursor
         with conn.cursor() as cur:
-            cur.execute(
-                QRY_EXISTS_REC, {"log_date": log_date, "in_clause": in_clause}
+            cur.execute(QRY_CREATE_COPY_TEMP)
+            cur.execute("TRUNCATE tmp_ssh_auth_error")
+            cur.copy_expert(
+                QRY_COPY_TEMP, IteratorReader(to_copy_line(*rec) for rec in records)
             )
-            # 実行されたSQLを出力
-            if logger is not None:
-                if cur.query is not None:
-                    logger.debug(f"{cur.query.decode('utf-8')}")
-            # 戻り値を取得する
-            # def fetchall(self) -> list[tuple[Any, ...]]
-            rows: List[Tuple[Any, ...]] = cur.fetchall()
+            cur.execute(QRY_INSERT_FROM_COPY_TEMP)
+            # 登録件数
+            inserted: int = cur.rowcount
             if logger is not None:
-                logger.debug(f"rows: {rows}")
-
-            # 結果が1カラムだけなのでタプルの先頭[0]をリストに格納
-            result: List[int] = [row[0] for row in rows]
-            return result
+                logger.debug(f"inserted: {inserted}")
+            return inserted
     except (Exception, psycopg2.DatabaseError) as err:
         raise err
 
 
-def bulk_insert_with_nofetch(
+def bulk_upsert_with_nofetch(
         conn: connection,
-        qry_params: tuple[Dict[str, Any], ...],
-        logger: Optional[Logger] = None) -> None:
+        records: List[Tuple[str, int, int]],
+        logger: Optional[Logger] = None,
+        page_size: int = 100) -> int:
+    # records: (log_date, ip_id, appear_count)
     try:
         cur: cursor
         with conn.cursor() as cur:
-            # 登録の戻り値不要
-            execute_values(
+            rows: List[Tuple[Any, ...]] = execute_values(
                 cur,
-                QRY_INSERT_WITH_NO_RETURN,
-                qry_params,
-                template=VALUES_TEMPLATE,
+                QRY_UPSERT_WITH_RETURN,
+                records,
+                template="(%s::DATE, %s, %s)",
+                page_size=page_size,
+                fetch=True
             )
-            # 実行されたSQLを出力
+            # 戻り値: 登録件数
             if logger is not None:
-                if cur.query is not None:
-                    logger.debug(f"{cur.query.decode('utf-8')}")
+                logger.debug(f"inserted: {len(rows)}")
+            return len(rows)
     except (Exception, psycopg2.DatabaseError) as err:
         raise err
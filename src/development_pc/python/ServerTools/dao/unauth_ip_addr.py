@@ -1,41 +1,176 @@
 from logging import Logger
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import psycopg2
 from psycopg2.extensions import connection, cursor
 from psycopg2.extras import execute_values
 
+from dao.prepared import PreparedQuery, execute_prepared
+from util.copy_util import IteratorReader, to_copy_line
+
 """
 不正アクセスIPテーブルのDB操作関数モジュール
 [スキーマ] mainte
 [対象テーブル] unauth_ip_addr
 """
 
-QRY_EXISTS_IP_ADDR: str = """
-SELECT id,ip_addr FROM mainte.unauth_ip_addr WHERE ip_addr IN %(in_clause)s;"""
+# 配列パラメータ1つあたりの最大要素数 ※超える場合は分割して検索する
+ARRAY_CHUNK_SIZE: int = 10000
+
+PREPARED_EXISTS_IP_ADDR: PreparedQuery = PreparedQuery(
+    name="exists_ip_addr",
+    param_types=("TEXT[]",),
+    query="SELECT id,ip_addr FROM mainte.unauth_ip_addr WHERE ip_addr = ANY($1)"
+)
+
+# COPY 登録用の一時テーブル ※同一トランザクションで複数回呼ばれた場合はTRUNCATEして再利用
+QRY_CREATE_COPY_TEMP: str = """
+CREATE TEMP TABLE IF NOT EXISTS tmp_unauth_ip_addr(
+   ip_addr VARCHAR(15) NOT NULL,
+   reg_date DATE NOT NULL
+) ON COMMIT DROP"""
+
+QRY_COPY_TEMP: str = """
+COPY tmp_unauth_ip_addr(ip_addr, reg_date) FROM STDIN"""
+
+# 登録済みIPアドレスのIDも含めて返却する
+#  ※同一クエリ内のSELECTはINSERT前のスナップショットを参照するため登録済みレコードのみ取得される
+QRY_UPSERT_FROM_COPY_TEMP: str = """
+WITH ins AS (
+   INSERT INTO mainte.unauth_ip_addr(ip_addr, reg_date)
+   SELECT ip_addr, reg_date FROM tmp_unauth_ip_addr
+   ON CONFLICT (ip_addr) DO NOTHING
+   RETURNING id,ip_addr
+)
+SELECT id,ip_addr FROM ins
+UNION ALL
+SELECT uia.id,uia.ip_addr FROM mainte.unauth_ip_addr uia
+   INNER JOIN tmp_unauth_ip_addr t ON uia.ip_addr = t.ip_addr"""
 
-QRY_INSERT_WITH_RETURN: str = """
-INSERT INTO mainte.unauth_ip_addr(ip_addr, reg_date) VALUES %s RETURNING id,ip_addr"""
+# 冪等な一括登録クエリー: 未登録IPアドレスは登録し、登録済みIPアドレスと合わせてIDを返却する
+QRY_UPSERT_WITH_RETURN: str = """
+WITH v(ip_addr, reg_date) AS (VALUES %s),
+ins AS (
+   INSERT INTO mainte.unauth_ip_addr(ip_addr, reg_date)
+   SELECT ip_addr, reg_date::DATE FROM v
+   ON CONFLICT (ip_addr) DO NOTHING
+   RETURNING id,ip_addr
+)
+SELECT id,ip_addr FROM ins
+UNION ALL
+SELECT uia.id,uia.ip_addr FROM mainte.unauth_ip_addr uia
+   INNER JOIN v ON uia.ip_addr = v.ip_addr"""
 
-VALUES_TEMPLATE: str = "(%(ip_addr)s, %(reg_date)s)"
+# 国コードがNULLのレコードをIPアドレス(数値)順にキーセットページングで取得するクエリー
+#  ※20_add_unauth_ip_number_null_cc_index.sql の部分インデックスを使用
+QRY_NULL_CC_PAGE: str = """
+SELECT
+   ip_number, ip_addr
+FROM
+   mainte.unauth_ip_addr
+WHERE
+   country_code IS NULL AND ip_number > %(last_ip_number)s
+ORDER BY
+   ip_number
+LIMIT %(page_size)s"""
+
+# 国コード一括更新クエリー ※(ip_addr, country_code)のVALUESリストと結合して1文で更新
+QRY_BULK_UPDATE_CC: str = """
+UPDATE mainte.unauth_ip_addr AS uia SET
+   country_code = v.country_code
+FROM
+   (VALUES %s) AS v(ip_addr, country_code)
+WHERE
+   uia.ip_addr = v.ip_addr"""
 
 
 def bulk_exists_ip_addr(conn: connection,
                         ip_list: List[str],
                         logger: Optional[Logger] = None) -> Dict[str, int]:
-    # IN ( in_clause )
-    in_clause: Tuple[str, ...] = tuple(ip_list)
     try:
+        # 戻り値: IPアドレスをキーとするIPのIDの辞書
+        result_dict: Dict[str, int] = {}
         cur: cursor
         with conn.cursor() as cur:
-            cur.execute(QRY_EXISTS_IP_ADDR, {"in_clause": in_clause})
+            # IN句の代わりに配列パラメータ1つで検索する ※リストの件数によらず同一形式のSQL
+            for i in range(0, len(ip_list), ARRAY_CHUNK_SIZE):
+                chunk: List[str] = ip_list[i:i + ARRAY_CHUNK_SIZE]
+                execute_prepared(cur, PREPARED_EXISTS_IP_ADDR, (chunk,))
+                # 配列で一致したIPアドレスの idとIPアドレスのタプルをすべて取得
+                rows: List[tuple[Any, ...]] = cur.fetchall()
+                # 配列の値は出力せずに件数のみ出力
+                if logger is not None:
+                    logger.debug(f"ip_list: {len(chunk)}, rows: {len(rows)}")
+                result_dict.update({ip_addr: ip_id for (ip_id, ip_addr) in rows})
+        return result_dict
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
+
+
+def bulk_update_country_code(
+        conn: connection,
+        ip_cc_list: List[Tuple[str, str]],
+        logger: Optional[Logger] = None) -> int:
+    try:
+        cur: cursor
+        with conn.cursor() as cur:
+            # 全件を1つのUPDATE文で実行する
+            execute_values(
+                cur,
+                QRY_BULK_UPDATE_CC,
+                ip_cc_list,
+                page_size=max(len(ip_cc_list), 1)
+            )
+            # 更新件数
+            updated: int = cur.rowcount
             if logger is not None:
-                if cur.query is not None:
-                    logger.debug(f"{cur.query.decode('utf-8')}")
-            # IN句で一致したIPアドレスの idとIPアドレスのタプルをすべて取得
-            rows: List[tuple[Any, ...]] = cur.fetchall()
+                logger.debug(f"updated: {updated}")
+            return updated
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
+
+
+def get_null_cc_page(
+        conn: connection,
+        last_ip_number: int,
+        page_size: int,
+        logger: Optional[Logger] = None) -> List[Tuple[int, str]]:
+    try:
+        cur: cursor
+        # サーバーサイドカーソル ※ページ毎にコミットするためページ単位で生成する
+        with conn.cursor(name="cur_null_cc_page") as cur:
+            cur.itersize = page_size
+            cur.execute(
+                QRY_NULL_CC_PAGE,
+                {"last_ip_number": last_ip_number, "page_size": page_size}
+            )
+            rows: List[Tuple[int, str]] = [row for row in cur]
+            if logger is not None:
+                logger.debug(f"rows.size: {len(rows)}")
+            return rows
+    except (Exception, psycopg2.DatabaseError) as err:
+        raise err
+
+
+# COPY で一時テーブルに登録してから INSERT ... SELECT する ※大量レコード用
+#  戻り値は bulk_upsert_with_fetch() と同じ (登録済みIPアドレスを含む)
+def bulk_copy_insert_with_fetch(
+        conn: connection,
+        records: Iterable[Tuple[str, str]],
+        logger: Optional[Logger] = None) -> Dict[str, int]:
+    # records: (ip_addr, reg_date)
+    try:
+        cur: cursor
+        with conn.cursor() as cur:
+            cur.execute(QRY_CREATE_COPY_TEMP)
+            cur.execute("TRUNCATE tmp_unauth_ip_addr")
+            cur.copy_expert(
+                QRY_COPY_TEMP, IteratorReader(to_copy_line(*rec) for rec in records)
+            )
+            cur.execute(QRY_UPSERT_FROM_COPY_TEMP)
+            rows: List[Tuple[Any, ...]] = cur.fetchall()
             if logger is not None:
-                logger.debug(f"rows: {rows}")
+                logger.debug(f"rows.size: {len(rows)}")
 
             # 戻り値: IPアドレスをキーとするIPのIDの辞書
             result_dict: Dict[str, int] = {ip_addr: ip_id for (ip_id, ip_addr) in rows}
@@ -44,28 +179,28 @@ def bulk_exists_ip_addr(conn: connection,
         raise err
 
 
-# execute_values()メソッドを実行する ※内部で (%s,%s),(%s,),... 部分を生成してくれる
-def bulk_insert_with_fetch(
+# 1回のクエリで登録と登録済みIDの取得を行う ※同一データで再実行しても重複登録しない
+def bulk_upsert_with_fetch(
         conn: connection,
-        qry_params: tuple[Dict[str, Any], ...],
-        logger: Optional[Logger] = None) -> Dict[str, int]:
+        records: List[Tuple[str, str]],
+        logger: Optional[Logger] = None,
+        page_size: int = 100) -> Dict[str, int]:
+    # records: (ip_addr, reg_date)
     try:
         cur: cursor
         with conn.cursor() as cur:
+            # page_size 毎にクエリを実行し全ページの結果を取得する
             rows: List[Tuple[Any, ...]] = execute_values(
                 cur,
-                QRY_INSERT_WITH_RETURN,
-                qry_params,
-                template=VALUES_TEMPLATE,
+                QRY_UPSERT_WITH_RETURN,
+                records,
+                page_size=page_size,
                 fetch=True
             )
-            # 実行されたSQLを出力
             if logger is not None:
-                if cur.query is not None:
-                    logger.debug(f"{cur.query.decode('utf-8')}")
-                logger.debug(f"rows: {rows}")
+                logger.debug(f"rows.size: {len(rows)}")
 
-            # 戻り値: IPアドレスをキーとするIPのIDの辞書
+            # 戻り値: IPアドレスをキーとするIPのIDの辞書 (登録済み + 新規登録)
             result_dict: Dict[str, int] = {ip_addr: ip_id for (ip_id, ip_addr) in rows}
             return result_dict
     except (Exception, psycopg2.DatabaseError) as err:
@@ -1,25 +1,32 @@
 import json
 import logging
 import socket
-from typing import Optional
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
 import psycopg2
 from psycopg2.extensions import connection
+from psycopg2.pool import ThreadedConnectionPool
 
 """
 PostgreSQL Database接続生成クラス
 """
 
 
+def load_db_conf(configfile, hostname: Optional[str] = None) -> Dict[str, Any]:
+    with open(configfile, 'r') as fp:
+        db_conf = json.load(fp)
+        if hostname is None:
+            hostname = socket.gethostname()
+        db_conf["host"] = db_conf["host"].format(hostname=hostname)
+    return db_conf
+
+
 class PgDatabase(object):
     def __init__(self, configfile,
                  hostname: Optional[str] = None,
                  logger: Optional[logging.Logger] = None):
         self.logger = logger
-        with open(configfile, 'r') as fp:
-            db_conf = json.load(fp)
-            if hostname is None:
-                hostname = socket.gethostname()
-            db_conf["host"] = db_conf["host"].format(hostname=hostname)
+        db_conf = load_db_conf(configfile, hostname=hostname)
         # default connection is itarable curosr
         self.conn = psycopg2.connect(**db_conf)
         # Dictinaly-like cursor connection.
@@ -43,3 +50,77 @@ class PgDatabase(object):
             if self.logger is not None:
                 self.logger.debug(f"Close {self.conn}")
             self.conn.close()
+
+
+# スレッドセーフなコネクションプール
+#  複数ワーカーや長時間実行するバッチで接続済みのコネクションを再利用する
+class PgDatabasePool(object):
+    def __init__(self, configfile,
+                 minconn: int = 1,
+                 maxconn: int = 4,
+                 hostname: Optional[str] = None,
+                 application_name: Optional[str] = None,
+                 statement_timeout_ms: Optional[int] = None,
+                 logger: Optional[logging.Logger] = None):
+        self.logger = logger
+        db_conf = load_db_conf(configfile, hostname=hostname)
+        # pg_stat_activity で識別するためのアプリケーション名
+        if application_name is not None:
+            db_conf["application_name"] = application_name
+        # 接続毎のステートメントタイムアウト
+        if statement_timeout_ms is not None:
+            db_conf["options"] = f"-c statement_timeout={statement_timeout_ms}"
+        self.pool = ThreadedConnectionPool(minconn, maxconn, **db_conf)
+        if self.logger is not None:
+            self.logger.debug(f"{self.pool}: minconn={minconn}, maxconn={maxconn}")
+
+    def __enter__(self) -> "PgDatabasePool":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    @staticmethod
+    def is_alive(conn: connection) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def get_connection(self) -> connection:
+        conn: connection = self.pool.getconn()
+        # ヘルスチェック: サーバー側で切断されていたら破棄して再接続
+        if not self.is_alive(conn):
+            if self.logger is not None:
+                self.logger.warning(f"Discard broken connection: {conn}")
+            self.pool.putconn(conn, close=True)
+            conn = self.pool.getconn()
+        return conn
+
+    def put_connection(self, conn: connection, close: bool = False) -> None:
+        self.pool.putconn(conn, close=close)
+
+    @contextmanager
+    def session(self) -> Iterator[connection]:
+        # 正常終了でコミット、例外発生でロールバックしてプールに返却する
+        conn: connection = self.get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn, close=bool(conn.closed))
+
+    def close(self) -> None:
+        if not self.pool.closed:
+            if self.logger is not None:
+                self.logger.debug(f"Close {self.pool}")
+            self.pool.closeall()
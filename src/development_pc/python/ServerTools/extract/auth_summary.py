@@ -0,0 +1,37 @@
+import os
+import re
+from collections import Counter
+from typing import List, Optional
+
+import util.file_util as fu
+
+"""
+サーバー側の収集スクリプト (ssh_auth_error_collector.py --summarize) が出力する日次サマリーファイルの読み込み
+ファイル名: AuthFail_ssh_YYYY-mm-dd.summary.tsv.gz
+
+[レコード形式] ※1行目はヘッダー
+ip_addr<TAB>appear_count<TAB>first_seen<TAB>last_seen<TAB>users
+(例) 122.53.23.163	467	2024-06-23T11:56:23	2024-06-23T12:20:25	root
+"""
+
+# ファイル名のログ日付抽出
+re_summary_file: re.Pattern = re.compile(r"^AuthFail_ssh_(\d{4}-\d{2}-\d{2})\.summary\.tsv\.gz$")
+SUMMARY_HEADER: str = "ip_addr\tappear_count\tfirst_seen\tlast_seen\tusers"
+
+
+def extract_summary_date(file_path: str) -> Optional[str]:
+    f_mat: Optional[re.Match] = re_summary_file.search(os.path.basename(file_path))
+    return f_mat.group(1) if f_mat else None
+
+
+def count_ip_addr_in_summary(file_path: str) -> Counter:
+    # IPアドレスごとの出現数 ※サマリーは集計済みのためそのまま読み込む
+    counter: Counter = Counter()
+    with fu.open_file(file_path, 'r') as fp:
+        header: str = fp.readline().rstrip("\n")
+        if header != SUMMARY_HEADER:
+            raise ValueError(f"Invalid summary header: {header}")
+        for line in fp:
+            fields: List[str] = line.rstrip("\n").split("\t")
+            counter[fields[0]] += int(fields[1])
+    return counter
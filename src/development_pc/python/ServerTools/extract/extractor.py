@@ -1,28 +1,145 @@
+import mmap
+import os
 import re
 from collections import Counter, OrderedDict
-from typing import List
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date
+from typing import IO, Iterator, List, Optional, Tuple, Union
 
-from util.file_util import file_read
+import util.file_util as fu
 
 """
 authentication failure
 """
 
+# バイト列検索が可能なバッファ
+Buffer = Union[bytes, mmap.mmap]
+
 # rhhost の後ろに何もないケースと "user=xxx"があるパターンがある
 # : authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost=218.92.0.96  user=root
 # : authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost=216.181.226.86
-re_auth_fail: re.Pattern = re.compile(r"^.+?rhost=([0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}).*$")
+#  ※行全体の正規表現 (先頭の ".+?" と末尾の ".*$" がバックトラックする) ではなく、
+#    ブロック単位のバイト列で先頭が固定文字列 "rhost=" のパターンのみを検索する
+re_rhost_ip: re.Pattern = re.compile(
+    rb"rhost=([0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3})"
+)
+# ファイル読み込みのブロックサイズ
+READ_BLOCK_SIZE: int = 4 * 1024 * 1024
+# 並列処理するファイルの最小サイズ ※小さいファイルはプロセス起動の方が遅い
+PARALLEL_MIN_SIZE: int = 16 * 1024 * 1024
+# ファイル名のログ日付抽出
+#  ※圧縮ファイル (.gz, .xz, .zst) も対象
+re_log_file: re.Pattern = re.compile(
+    r"^AuthFail_ssh_(\d{4}-\d{2}-\d{2})\.log(\.gz|\.xz|\.zst)?$"
+)
+FMT_OUT_CSV: str = "ssh_auth_error_{}.csv"
+# CSVファイルの圧縮形式 (既定)
+CSV_COMPRESS_SUFFIX: str = ".gz"
+# CSV format
+CSV_HEADER: str = '"log_date","ip_addr","appear_count"'
+
+
+def find_ip_addr(buf: Buffer, start: int = 0, end: Optional[int] = None) -> List[bytes]:
+    # バッファ (bytes, mmap) の [start, end) から "rhost=IPアドレス" のIPアドレスを全て抽出する
+    #  ※end は行末 (改行の直後) であること
+    return re_rhost_ip.findall(buf, start, len(buf) if end is None else end)
+
+
+def next_ip_block(fp: IO[bytes], block_size: int = READ_BLOCK_SIZE) -> Iterator[List[bytes]]:
+    # ブロック単位で読み込み、最後の改行までを検索して残りは次のブロックの先頭に連結する
+    #  ※ブロック毎に抽出したIPアドレス (バイト列) のリストを返す
+    remain: bytes = b""
+    while True:
+        block: bytes = fp.read(block_size)
+        if not block:
+            break
+        buf: bytes = remain + block if remain else block
+        last_nl: int = buf.rfind(b"\n")
+        if last_nl < 0:
+            remain = buf
+            continue
+        yield find_ip_addr(buf, 0, last_nl + 1)
+        remain = buf[last_nl + 1:]
+    if remain:
+        yield find_ip_addr(remain)
+
+
+def count_ip_addr_in_stream(fp: IO[bytes], counter: Optional[Counter] = None,
+                            block_size: int = READ_BLOCK_SIZE) -> Counter:
+    # ※カウンターのキーはバイト列 (呼び出し側で文字列に変換する)
+    if counter is None:
+        counter = Counter()
+    for ip_list in next_ip_block(fp, block_size):
+        counter.update(ip_list)
+    return counter
+
+
+def decode_counter(counter: Counter) -> Counter:
+    # バイト列キーのカウンターを文字列キーに変換する
+    return Counter({ip.decode("ascii"): cnt for ip, cnt in counter.items()})
 
 
 def extract_ip_list(log_file: str) -> List[str]:
-    lines: List[str] = file_read(log_file)
     # 重複の可能性のあるIPリスト
-    ip_list: List[str] = []
-    for line in lines:
-        mat: re.Match = re_auth_fail.search(line)
-        if mat:
-            ip_list.append(mat.group(1))
-    return ip_list
+    #  ※ファイル全体を読み込まずにブロック単位で抽出する
+    result: List[str] = []
+    with fu.open_file(log_file, 'rb') as fp:
+        for ip_list in next_ip_block(fp):
+            result.extend([ip.decode("ascii") for ip in ip_list])
+    return result
+
+
+def count_ip_addr(log_file: str) -> Counter:
+    # IPリストを作らずにログをブロック単位で読み込みながら出現数をカウントする
+    #  ※圧縮ファイルは展開しながら読み込む
+    with fu.open_file(log_file, 'rb') as fp:
+        return decode_counter(count_ip_addr_in_stream(fp))
+
+
+def split_line_ranges(buf: Buffer, parts: int) -> List[Tuple[int, int]]:
+    # バッファをほぼ等分し、各区間の終わりを次の改行の直後にそろえる
+    size: int = len(buf)
+    ranges: List[Tuple[int, int]] = []
+    start: int = 0
+    for i in range(1, parts + 1):
+        if start >= size:
+            break
+        end: int = size
+        if i < parts:
+            nl: int = buf.find(b"\n", max(start, size * i // parts))
+            end = size if nl < 0 else nl + 1
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _count_ip_addr_in_range(log_file: str, start: int, end: int) -> Counter:
+    # ワーカープロセス: ファイルをメモリマップして担当区間のみ検索する
+    with open(log_file, 'rb') as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return Counter(find_ip_addr(mm, start, end))
+
+
+def count_ip_addr_parallel(log_file: str, jobs: int) -> Counter:
+    # ファイルを改行位置で分割し、プロセスプールで並列にカウントして結合する
+    #  ※区間順に結合するため、キーの順序 (初出順) は count_ip_addr() と同じになる
+    #  ※圧縮ファイルはメモリマップで分割できないため1プロセスで処理する
+    if jobs <= 1 or os.path.getsize(log_file) < PARALLEL_MIN_SIZE \
+            or fu.detect_compression(log_file) is not None:
+        return count_ip_addr(log_file)
+
+    with open(log_file, 'rb') as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            ranges: List[Tuple[int, int]] = split_line_ranges(mm, jobs)
+    counter: Counter = Counter()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures: List[Future] = [
+            executor.submit(_count_ip_addr_in_range, log_file, start, end)
+            for (start, end) in ranges
+        ]
+        for future in futures:
+            counter.update(future.result())
+    return decode_counter(counter)
 
 
 def extract_over_ip_list(ip_list: List[str], appear_limit: int)-> OrderedDict[str, int]:
@@ -34,3 +151,21 @@ def extract_over_ip_list(ip_list: List[str], appear_limit: int)-> OrderedDict[st
         if appear_cnt >= appear_limit:
             ip_dict[ip] = appear_cnt
     return ip_dict
+
+
+def extract_log_date(file_path: str) -> str:
+    # ファイル名から日付を取得
+    b_name: str = os.path.basename(file_path)
+    f_mat: Optional[re.Match] = re_log_file.search(b_name)
+    if f_mat:
+        return f_mat.group(1)
+    else:
+        return date.today().isoformat()
+
+
+def get_csv_path(s_date: str, out_csv_dir: str, compress: bool = True) -> str:
+    # 既定は圧縮ファイル名 (ssh_auth_error_YYYY-mm-dd.csv.gz)
+    save_name: str = FMT_OUT_CSV.format(s_date)
+    if compress:
+        save_name += CSV_COMPRESS_SUFFIX
+    return os.path.join(os.path.expanduser(out_csv_dir), save_name)
@@ -0,0 +1,36 @@
+from typing import Iterator, List, Tuple
+
+import util.file_util as fu
+
+"""
+RIR統計交換フォーマット (delegated-*-extended) ファイルから ipv4 の割当レコードを抽出する
+https://www.apnic.net/about-apnic/corporate-documents/documents/
+    resource-guidelines/rir-statistics-exchange-format/
+
+[レコード形式]
+registry|cc|type|start|value|date|status[|extensions...]
+(例) apnic|AU|ipv4|1.0.0.0|256|20110811|assigned|A91872ED
+"""
+
+# 割当済みではないステータス
+EXCLUDE_STATUS: Tuple[str, ...] = ("available", "reserved")
+
+
+def read_ipv4_records(file_path: str) -> Iterator[Tuple[str, str, str, int, str]]:
+    # ファイルを1行ずつ読み込み ipv4 の割当レコードのみを返却する
+    # 戻り値: (registry, ip_start, country_code, ip_count, allocated_date[YYYY-mm-dd])
+    #  ※圧縮ファイルは展開しながら読み込む
+    with fu.open_file(file_path, 'r') as fp:
+        for line in fp:
+            # コメント行
+            if line.startswith("#"):
+                continue
+            fields: List[str] = line.rstrip("\n").split("|")
+            # バージョン行、サマリー行、ipv4以外は対象外
+            if len(fields) < 7 or fields[2] != "ipv4" or fields[1] == "*":
+                continue
+            (registry, cc, _, ip_start, value, s_date, status) = fields[:7]
+            if status in EXCLUDE_STATUS or len(cc) != 2 or len(s_date) != 8:
+                continue
+            yield (registry, ip_start, cc, int(value),
+                   f"{s_date[:4]}-{s_date[4:6]}-{s_date[6:]}")
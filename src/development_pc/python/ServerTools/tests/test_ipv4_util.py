@@ -0,0 +1,77 @@
+import random
+import unittest
+from typing import List, Optional
+
+import util.ipv4_codec as codec
+import util.ipv4_util as ipv4_u
+from util.rir_lookup import RirLookup
+
+"""
+numpy による一括変換・一括検索 (ipv4_util.*_bulk) と1件ずつの変換・検索 (ipv4_codec, RirLookup) の一致確認
+[実行方法] ServerTools ディレクトリで実行
+  python3 -m unittest discover -s tests -t .
+"""
+
+# ipv4_codec.ip_to_int で判定が分かれる入力
+EDGE_IP_LIST: List[str] = [
+    "0.0.0.0", "1.2.3.4", "10.0.0.1", "100.200.30.4", "255.255.255.255",
+    "01.2.3.4", "1.0001.2.3", "1.2.3.04", "1.2.3.00", "001.2.3.4", "1.2.3.256",
+    "256.1.1.1", "1.2.3", "1.2.3.4.5", "1..2.3", ".1.2.3", "1.2.3.", "1.2.3.4 ",
+    " 1.2.3.4", "1.2\x00.3.4", "1.2.3.4\x00", "\x001.2.3.4", "a.b.c.d", "1.2.3.-4", "",
+    "1234.1.1.1", "255.255.255.2555",
+]
+
+
+def scalar_ip_to_int(ip: str) -> Optional[int]:
+    try:
+        return codec.ip_to_int(ip)
+    except ValueError:
+        return None
+
+
+def bulk_ip_to_int(ip: str) -> Optional[int]:
+    try:
+        return int(ipv4_u.ip_to_int_bulk([ip])[0])
+    except ValueError:
+        return None
+
+
+@unittest.skipUnless(ipv4_u.has_numpy(), "numpy is not installed.")
+class TestIpToIntBulk(unittest.TestCase):
+    def test_parity_with_codec(self):
+        for ip in EDGE_IP_LIST:
+            with self.subTest(ip=ip):
+                self.assertEqual(bulk_ip_to_int(ip), scalar_ip_to_int(ip))
+
+    def test_random_addresses(self):
+        ip_list: List[str] = [
+            codec.int_to_ip(random.randrange(codec.IPV4_MAX + 1)) for _ in range(10000)
+        ]
+        self.assertEqual(
+            ipv4_u.ip_to_int_bulk(ip_list).tolist(), [codec.ip_to_int(ip) for ip in ip_list]
+        )
+
+    def test_invalid_in_list(self):
+        with self.assertRaises(ValueError):
+            ipv4_u.ip_to_int_bulk(["1.2.3.4", "01.2.3.4"])
+
+
+@unittest.skipUnless(ipv4_u.has_numpy(), "numpy is not installed.")
+class TestFindRangeIndexBulk(unittest.TestCase):
+    def test_empty_ranges(self):
+        self.assertEqual(ipv4_u.find_range_index_bulk([16909060], [], []).tolist(), [-1])
+        self.assertEqual(RirLookup([]).lookup_bulk(["1.2.3.4"]), [(None, None)])
+
+    def test_parity_with_lookup(self):
+        rir_lookup: RirLookup = RirLookup([
+            ("1.0.0.0", 256, "AU"), ("1.0.1.0", 768, "CN"), ("1.0.16.0", 4096, "JP")
+        ])
+        ip_list: List[str] = ["0.255.255.255", "1.0.0.0", "1.0.3.255", "1.0.4.0", "1.0.16.1",
+                              "1.0.31.255", "1.0.32.0", "255.255.255.255"]
+        self.assertEqual(
+            rir_lookup.lookup_bulk(ip_list), [rir_lookup.lookup(ip) for ip in ip_list]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
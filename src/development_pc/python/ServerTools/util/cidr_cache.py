@@ -0,0 +1,103 @@
+import logging
+import sqlite3
+from typing import Dict, List, Optional, Set, Tuple
+
+import util.ipv4_codec as codec
+
+"""
+IPネットワーク(CIDR表記)と国コードの永続キャッシュ (SQLite)
+実行ごとに解決したネットワークを保存し、次回以降はデータベースに問い合わせずに国コードを取得する
+※RIRテーブルの洗い替え日時 (RIR_ipv4_load_history.loaded_at) が変わったらキャッシュを破棄する
+"""
+
+QRY_CREATE_META: str = """
+CREATE TABLE IF NOT EXISTS cache_meta(
+   key TEXT PRIMARY KEY,
+   value TEXT NOT NULL
+)"""
+
+QRY_CREATE_CIDR_CC: str = """
+CREATE TABLE IF NOT EXISTS cidr_cc(
+   network INTEGER NOT NULL,
+   prefix_len INTEGER NOT NULL,
+   country_code TEXT NOT NULL,
+   PRIMARY KEY (network, prefix_len)
+)"""
+
+META_RIR_LOADED_AT: str = "rir_loaded_at"
+
+
+class CidrCache(object):
+    def __init__(self, db_file: str, rir_loaded_at: str,
+                 logger: Optional[logging.Logger] = None):
+        self.logger = logger
+        self.conn: sqlite3.Connection = sqlite3.connect(db_file)
+        self.conn.execute(QRY_CREATE_META)
+        self.conn.execute(QRY_CREATE_CIDR_CC)
+        # キャッシュ作成時のRIRテーブル洗い替え日時と異なれば破棄する
+        row: Optional[Tuple[str]] = self.conn.execute(
+            "SELECT value FROM cache_meta WHERE key=?", (META_RIR_LOADED_AT,)
+        ).fetchone()
+        if row is None or row[0] != rir_loaded_at:
+            if self.logger is not None:
+                self.logger.info(f"CidrCache invalidated: {row} -> {rir_loaded_at}")
+            self.conn.execute("DELETE FROM cidr_cc")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache_meta(key, value) VALUES (?, ?)",
+                (META_RIR_LOADED_AT, rir_loaded_at)
+            )
+            self.conn.commit()
+        # 全件をメモリに展開: (ネットワークアドレス(数値), プレフィックス長) -> 国コード
+        self.networks: Dict[Tuple[int, int], str] = {
+            (network, prefix_len): cc for (network, prefix_len, cc) in
+            self.conn.execute("SELECT network, prefix_len, country_code FROM cidr_cc")
+        }
+        # キャッシュに存在するプレフィックス長のみ検索する (長い順)
+        self.prefix_lens: List[int] = sorted(
+            {prefix_len for (_, prefix_len) in self.networks}, reverse=True
+        )
+        self.new_networks: Set[Tuple[int, int]] = set()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, target_ip: str) -> Optional[Tuple[str, str]]:
+        ip_num: int = codec.ip_to_int(target_ip)
+        for prefix_len in self.prefix_lens:
+            network: int = codec.network_address(ip_num, prefix_len)
+            cc: Optional[str] = self.networks.get((network, prefix_len))
+            if cc is not None:
+                self.hits += 1
+                return codec.to_cidr(network, prefix_len), cc
+        self.misses += 1
+        return None
+
+    def put(self, cidr: str, country_code: str) -> None:
+        s_network, s_prefix = cidr.split("/")
+        key: Tuple[int, int] = (codec.ip_to_int(s_network), int(s_prefix))
+        if key in self.networks:
+            return
+        self.networks[key] = country_code
+        self.new_networks.add(key)
+        if key[1] not in self.prefix_lens:
+            self.prefix_lens = sorted(self.prefix_lens + [key[1]], reverse=True)
+
+    def save(self) -> None:
+        # 今回追加されたネットワークのみ保存
+        if len(self.new_networks) > 0:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cidr_cc(network, prefix_len, country_code)"
+                " VALUES (?, ?, ?)",
+                [(network, prefix_len, self.networks[(network, prefix_len)])
+                 for (network, prefix_len) in self.new_networks]
+            )
+            self.conn.commit()
+            self.new_networks.clear()
+
+    def close(self) -> None:
+        self.save()
+        if self.logger is not None:
+            self.logger.info(
+                f"CidrCache hits: {self.hits}, misses: {self.misses}"
+                f", networks: {len(self.networks)}"
+            )
+        self.conn.close()
@@ -0,0 +1,40 @@
+import io
+from typing import Iterable, Iterator, List, Optional
+
+"""
+COPY FROM STDIN 用ユーティリティ
+行のイテレータをファイルオブジェクトとして copy_expert() に渡す
+"""
+
+
+class IteratorReader(io.TextIOBase):
+    def __init__(self, lines: Iterable[str]):
+        self._lines: Iterator[str] = iter(lines)
+        self._buf: str = ""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> str:
+        if size is None or size < 0:
+            # 残り全て
+            result: str = self._buf + "".join(self._lines)
+            self._buf = ""
+            return result
+
+        chunks: List[str] = [self._buf]
+        buf_size: int = len(self._buf)
+        while buf_size < size:
+            line: Optional[str] = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            buf_size += len(line)
+        data: str = "".join(chunks)
+        self._buf = data[size:]
+        return data[:size]
+
+
+def to_copy_line(*fields: object) -> str:
+    # COPY テキスト形式の1行 ※値にタブ、改行、バックスラッシュを含まないこと
+    return "\t".join("\\N" if field is None else str(field) for field in fields) + "\n"
@@ -1,17 +1,105 @@
 import csv
+import gzip
 import json
-from typing import Any, Dict, List, Optional
+import lzma
+import os
+from typing import IO, Any, Dict, List, Literal, Optional, cast, overload
+
+# zstd は任意 ※未インストールの場合は zstd 圧縮ファイルのみ扱えない
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+"""
+ファイル入出力ユーティリティ
+読み込みはファイル先頭のマジックナンバー、書き込みは拡張子で圧縮形式 (gzip, xz, zstd) を判定し
+一時ファイルに展開せずにストリームで読み書きする
+"""
+
+# 圧縮形式: 拡張子
+COMPRESSION_SUFFIXES: Dict[str, str] = {"gzip": ".gz", "xz": ".xz", "zstd": ".zst"}
+# 圧縮形式: マジックナンバー
+COMPRESSION_MAGICS: Dict[str, bytes] = {
+    "gzip": b"\x1f\x8b", "xz": b"\xfd7zXZ\x00", "zstd": b"\x28\xb5\x2f\xfd"
+}
+
+
+def detect_compression(file_name: str) -> Optional[str]:
+    # 既存ファイルの圧縮形式 ※非圧縮は None
+    with open(file_name, 'rb') as fp:
+        head: bytes = fp.read(6)
+    for compression, magic in COMPRESSION_MAGICS.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def get_compression_by_name(file_name: str) -> Optional[str]:
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if file_name.endswith(suffix):
+            return compression
+    return None
+
+
+def find_file(file_name: str) -> Optional[str]:
+    # 指定したファイル または 圧縮形式の拡張子を付けたファイルのうち最初に存在するもの
+    candidates: List[str] = [file_name] + [
+        file_name + suffix for suffix in COMPRESSION_SUFFIXES.values()
+    ]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+@overload
+def open_file(file_name: str, mode: Literal['r', 'w', 'a', 'rt', 'wt', 'at'] = 'r') -> IO[str]: ...
+
+
+@overload
+def open_file(file_name: str, mode: Literal['rb', 'wb', 'ab']) -> IO[bytes]: ...
+
+
+@overload
+def open_file(file_name: str, mode: str) -> IO[Any]: ...
+
+
+def open_file(file_name: str, mode: str = 'r') -> IO[Any]:
+    # open() と同じモード ('r', 'w', 'a' と 'b') で圧縮ファイルを透過的に開く
+    #  ※テキストモードは IO[str], バイナリモードは IO[bytes] を返す
+    compression: Optional[str] = (
+        detect_compression(file_name) if mode.startswith('r')
+        else get_compression_by_name(file_name)
+    )
+    if compression is None:
+        return open(file_name, mode)
+
+    # 圧縮ファイルの open() はモード 'r' がバイナリのためテキストは 't' を付ける
+    comp_mode: str = mode if 'b' in mode else f"{mode}t"
+    if compression == "gzip":
+        return cast(IO[Any], gzip.open(file_name, comp_mode))
+    if compression == "xz":
+        return cast(IO[Any], lzma.open(file_name, comp_mode))
+    if zstandard is None:
+        raise RuntimeError(f"zstandard is not installed: {file_name}")
+    return cast(IO[Any], zstandard.open(file_name, comp_mode))
 
 
 def read_json(file_name: str) -> Dict[str, Any]:
-    with open(file_name, 'r') as fp:
+    with open_file(file_name, 'r') as fp:
         data = json.load(fp)
     return data
 
 
+def write_json(file_name: str, data: Dict[str, Any]) -> None:
+    with open_file(file_name, 'w') as fp:
+        json.dump(data, fp)
+
+
 def read_text(file_name: str) -> List[str]:
     lines: List[str] = []
-    with open(file_name, 'r') as fp:
+    with open_file(file_name, 'r') as fp:
         for line in fp:
             lines.append(line)
     return lines
@@ -20,7 +108,7 @@ def read_text(file_name: str) -> List[str]:
 def write_text_lines(file_name: str, save_list: List[str],
                      append_file: bool = False) -> None:
     save_mode: str = 'a' if append_file else 'w'
-    with open(file_name, save_mode) as fp:
+    with open_file(file_name, save_mode) as fp:
         for save_line in save_list:
             fp.write(f"{save_line}\n")
         fp.flush()
@@ -28,7 +116,7 @@ def write_text_lines(file_name: str, save_list: List[str],
 
 def read_csv(file_name: str,
              skip_header=True, header_cnt=1) -> List[str]:
-    with open(file_name, 'r') as fp:
+    with open_file(file_name, 'r') as fp:
         reader = csv.reader(fp, dialect='unix')
         if skip_header:
             for skip in range(header_cnt):
@@ -41,7 +129,7 @@ def read_csv(file_name: str,
 def write_csv(
         file_name: str, save_list: List[str],
         header: Optional[str] = None) -> None:
-    with open(file_name, 'w') as fp:
+    with open_file(file_name, 'w') as fp:
         if header is not None:
             fp.write(f"{header}\n")
         for save_line in save_list:
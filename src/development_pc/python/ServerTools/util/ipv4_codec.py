@@ -0,0 +1,78 @@
+import socket
+from typing import Iterator, Optional, Tuple
+
+"""
+IPv4アドレスの文字列と数値 (uint32) の相互変換、プレフィックス・マスク、CIDR分割を整数演算で行うモジュール
+ipaddress モジュールのオブジェクトを生成しないため、大量のIPを処理するループで使用する
+※数値はテーブルの ip_number (ip_start_num, ip_end_num) と同じ値
+"""
+
+IPV4_MAX: int = 0xffffffff
+
+# モジュール属性の参照を省くためローカル名にする
+_inet_pton = socket.inet_pton
+_inet_ntoa = socket.inet_ntoa
+_AF_INET: int = socket.AF_INET
+_from_bytes = int.from_bytes
+
+
+def ip_to_int(ip: str) -> int:
+    # inet_pton は短縮形 ("1.2.3")、先頭ゼロ、範囲外のオクテットを受け付けない
+    try:
+        return _from_bytes(_inet_pton(_AF_INET, ip), "big")
+    except OSError:
+        raise ValueError(f"Invalid IP address: {ip}")
+
+
+def int_to_ip(ip_num: int) -> str:
+    return _inet_ntoa(ip_num.to_bytes(4, "big"))
+
+
+def prefix_to_mask(prefix_len: int) -> int:
+    return (IPV4_MAX << (32 - prefix_len)) & IPV4_MAX
+
+
+def mask_to_prefix(mask: int) -> int:
+    # 連続したビットのマスクであること (例: 255.255.252.0)
+    return 32 - ((~mask & IPV4_MAX).bit_length())
+
+
+def network_address(ip_num: int, prefix_len: int) -> int:
+    return ip_num & prefix_to_mask(prefix_len)
+
+
+def broadcast_address(ip_num: int, prefix_len: int) -> int:
+    return ip_num | (~prefix_to_mask(prefix_len) & IPV4_MAX)
+
+
+def to_cidr(network: int, prefix_len: int) -> str:
+    return f"{int_to_ip(network)}/{prefix_len}"
+
+
+def cidr_to_range(cidr: str) -> Tuple[int, int]:
+    # 戻り値: (ネットワークアドレス, ブロードキャストアドレス)
+    s_network, s_prefix = cidr.split("/")
+    prefix_len: int = int(s_prefix)
+    ip_num: int = ip_to_int(s_network)
+    return network_address(ip_num, prefix_len), broadcast_address(ip_num, prefix_len)
+
+
+def range_to_cidrs(ip_first: int, ip_last: int) -> Iterator[Tuple[int, int]]:
+    # summarize_address_range() と同じ分割規則で範囲をCIDRブロックに分割する
+    # 戻り値: (ネットワークアドレス, プレフィックス長) のイテレータ
+    cur: int = ip_first
+    while cur <= ip_last:
+        # 開始アドレスの境界で取れる最大ブロックと残りアドレス数で取れる最大ブロックの小さい方
+        align_size: int = cur & -cur if cur > 0 else 1 << 32
+        remain_size: int = 1 << ((ip_last - cur + 1).bit_length() - 1)
+        block_size: int = min(align_size, remain_size)
+        yield cur, 32 - (block_size.bit_length() - 1)
+        cur += block_size
+
+
+def get_cidr_in_range(ip_first: int, ip_last: int, target_num: int) -> Optional[str]:
+    # 範囲を分割したCIDRブロックのうちターゲットIPを含むブロック
+    for network, prefix_len in range_to_cidrs(ip_first, ip_last):
+        if target_num < network + (1 << (32 - prefix_len)):
+            return to_cidr(network, prefix_len) if target_num >= network else None
+    return None
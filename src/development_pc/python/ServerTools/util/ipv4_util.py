@@ -3,12 +3,22 @@ from ipaddress import (
     IPv4Address, IPv4Network
 )
 import typing
-from typing import List, Iterator, Optional, Tuple
+from typing import Any, List, Iterator, Optional, Sequence, Tuple
+
+# 一括変換・一括検索 (*_bulk 関数) でのみ使用する ※未インストールでも他の関数は使用可能
+try:
+    import numpy as np
+    HAS_NUMPY: bool = True
+except ImportError:
+    HAS_NUMPY = False
 
 """
 IPv4アドレス操作関数ユーティリティ
 """
 
+# ドット区切りIPアドレスの最大文字数 "255.255.255.255"
+IP_STR_MAX_LEN: int = 15
+
 
 @typing.no_type_check
 # Suppress: Incompatible types in assignment (expression has type
@@ -42,3 +52,69 @@ def detect_cc_in_cidr_cc_list(
             break
 
     return match_network, match_cc
+
+
+def has_numpy() -> bool:
+    return HAS_NUMPY
+
+
+def ip_to_int_bulk(ip_list: Sequence[str]) -> Any:
+    # ドット区切りIPアドレスのリストを uint32 の numpy 配列に一括変換する
+    #  固定長バイト列の2次元配列にして、文字位置 (最大15) ごとに全行をまとめて計算する
+    if not HAS_NUMPY:
+        raise RuntimeError("numpy is not installed.")
+    # 固定長バイト列は末尾の NUL を削除するため変換前に確認する ※ipv4_codec.ip_to_int は NUL を含む文字列は不正
+    if "\0" in "".join(ip_list):
+        bad_ip: str = next(ip for ip in ip_list if "\0" in ip)
+        raise ValueError(f"Invalid IP address: {bad_ip!r}")
+    ip_bytes: Any = np.array(ip_list, dtype="S")
+    if ip_bytes.dtype.itemsize > IP_STR_MAX_LEN:
+        # 最大文字数を超える文字列は不正
+        bad_idx: int = int(np.argmax(np.char.str_len(ip_bytes) > IP_STR_MAX_LEN))
+        raise ValueError(f"Invalid IP address: {ip_list[bad_idx]}")
+    chars: Any = ip_bytes.astype(f"S{IP_STR_MAX_LEN}").view(np.uint8).reshape(
+        -1, IP_STR_MAX_LEN
+    )
+    rows: int = chars.shape[0]
+    # value: 確定したオクテットの累積値, octet: 現在のオクテット, digits: 現在のオクテットの桁数
+    value: Any = np.zeros(rows, dtype=np.uint64)
+    octet: Any = np.zeros(rows, dtype=np.uint64)
+    digits: Any = np.zeros(rows, dtype=np.uint8)
+    dots: Any = np.zeros(rows, dtype=np.uint8)
+    invalid: Any = np.zeros(rows, dtype=bool)
+    for col in range(IP_STR_MAX_LEN):
+        c: Any = chars[:, col]
+        is_digit: Any = (c >= 0x30) & (c <= 0x39)
+        is_dot: Any = c == 0x2e
+        # 数字とドット、末尾の詰め文字(0x00)以外は不正
+        invalid |= ~(is_digit | is_dot | (c == 0))
+        # ipv4_codec.ip_to_int と同じく先頭ゼロ ("01") と4桁以上のオクテットは不正
+        invalid |= is_digit & (((digits == 1) & (octet == 0)) | (digits >= 3))
+        # ドット: 現在のオクテットを確定する ※空のオクテットは不正
+        invalid |= is_dot & ((digits == 0) | (octet > 255))
+        value = np.where(is_dot, (value << np.uint64(8)) | octet, value)
+        octet = np.where(is_digit, octet * np.uint64(10) + (c - 0x30), np.where(is_dot, 0, octet))
+        digits = np.where(is_digit, digits + 1, np.where(is_dot, 0, digits))
+        dots += is_dot
+    invalid |= (dots != 3) | (digits == 0) | (octet > 255)
+    if invalid.any():
+        bad_idx = int(np.argmax(invalid))
+        raise ValueError(f"Invalid IP address: {ip_list[bad_idx]}")
+    return ((value << np.uint64(8)) | octet).astype(np.uint32)
+
+
+def find_range_index_bulk(ip_numbers: Any, ip_starts: Any, ip_ends: Any) -> Any:
+    # 昇順の開始IP配列を二分探索 (np.searchsorted) し、各IPが属する範囲のインデックスを一括で求める
+    #  ※範囲外のIPは -1
+    if not HAS_NUMPY:
+        raise RuntimeError("numpy is not installed.")
+    starts: Any = np.asarray(ip_starts)
+    ends: Any = np.asarray(ip_ends)
+    if len(starts) == 0:
+        # 割当範囲がない場合は全て範囲外
+        return np.full(len(ip_numbers), -1, dtype=np.int64)
+    nums: Any = np.asarray(ip_numbers, dtype=starts.dtype)
+    idx: Any = np.searchsorted(starts, nums, side="right") - 1
+    safe_idx: Any = np.maximum(idx, 0)
+    matched: Any = (idx >= 0) & (nums <= ends[safe_idx])
+    return np.where(matched, idx, -1)
@@ -0,0 +1,73 @@
+import logging
+from array import array
+from bisect import bisect_right
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import util.ipv4_codec as codec
+import util.ipv4_util as ipv4_u
+
+"""
+RIR_ipv4_allocated テーブルの全レコードをメモリに展開し、
+ターゲットIPのネットワーク(CIDR表記)と国コードを二分探索で取得するクラス
+[前提] RIRの割当範囲は重複しない
+"""
+
+
+class RirLookup(object):
+    def __init__(self,
+                 rows: Iterable[Tuple[str, int, str]],
+                 logger: Optional[logging.Logger] = None):
+        # 開始IPアドレス(数値)の昇順にソート
+        recs: List[Tuple[int, int, str]] = sorted(
+            (codec.ip_to_int(ip_start), int(ip_count), cc)
+            for (ip_start, ip_count, cc) in rows
+        )
+        # 開始IP, 終了IP(ブロードキャスト) は uint32 配列、国コードはリストで保持する
+        #  ※RirSnapshot はメモリマップのビューを設定するためシーケンス型で宣言する
+        self.ip_starts: Sequence[int] = array('L', [rec[0] for rec in recs])
+        self.ip_ends: Sequence[int] = array('L', [rec[0] + rec[1] - 1 for rec in recs])
+        self.country_codes: Sequence[str] = [rec[2] for rec in recs]
+        if logger is not None:
+            logger.info(f"RirLookup.size: {len(self.country_codes)}")
+
+    def __len__(self) -> int:
+        return len(self.country_codes)
+
+    def find_index(self, ip_num: int) -> int:
+        # ターゲット以下の最大の開始IPを持つレコード
+        idx: int = bisect_right(self.ip_starts, ip_num) - 1
+        if idx < 0 or self.ip_ends[idx] < ip_num:
+            # 割当範囲外
+            return -1
+        return idx
+
+    def lookup(self, target_ip: str) -> Tuple[Optional[str], Optional[str]]:
+        ip_num: int = codec.ip_to_int(target_ip)
+        idx: int = self.find_index(ip_num)
+        if idx < 0:
+            return None, None
+
+        match_network: Optional[str] = codec.get_cidr_in_range(
+            self.ip_starts[idx], self.ip_ends[idx], ip_num
+        )
+        return match_network, self.country_codes[idx]
+
+    def lookup_bulk(self, target_ip_list: List[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+        # numpy で全IPの数値変換と範囲検索を一括で行う ※未インストールの場合は1件ずつ検索する
+        if not ipv4_u.has_numpy():
+            return [self.lookup(target_ip) for target_ip in target_ip_list]
+
+        ip_numbers: List[int] = ipv4_u.ip_to_int_bulk(target_ip_list).tolist()
+        indexes: List[int] = ipv4_u.find_range_index_bulk(
+            ip_numbers, self.ip_starts, self.ip_ends
+        ).tolist()
+        result: List[Tuple[Optional[str], Optional[str]]] = []
+        for ip_num, idx in zip(ip_numbers, indexes):
+            if idx < 0:
+                result.append((None, None))
+            else:
+                result.append((
+                    codec.get_cidr_in_range(self.ip_starts[idx], self.ip_ends[idx], ip_num),
+                    self.country_codes[idx]
+                ))
+        return result
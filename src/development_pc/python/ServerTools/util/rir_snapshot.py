@@ -0,0 +1,148 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Union, overload
+
+from util.rir_lookup import RirLookup
+
+"""
+RIR_ipv4_allocated テーブルと国コードマスタのスナップショット (バイナリファイル) の出力と読み込み
+ファイルをメモリマップしてコピーせずに二分探索するため、PostgreSQLなしで即座に検索できる
+
+[ファイル形式] ※リトルエンディアン
+  ヘッダー: マジック(4s), バージョン(H), 国コード数(H), レコード数(I), メタ情報サイズ(I)
+  国コード表: 国コード(ASCII 2バイト) x 国コード数 ※4バイト境界までゼロ埋め
+  開始IP: uint32 x レコード数 ※昇順
+  終了IP: uint32 x レコード数
+  国コード表のインデックス: uint16 x レコード数 ※4バイト境界までゼロ埋め
+  メタ情報: UTF-8 JSON {"rir_loaded_at": 洗い替え日時, "country_names": {国コード: 国名}}
+"""
+
+SNAPSHOT_MAGIC: bytes = b"RIR4"
+SNAPSHOT_VERSION: int = 1
+HEADER_FMT: str = "<4sHHII"
+HEADER_SIZE: int = struct.calcsize(HEADER_FMT)
+
+
+def _padding(size: int) -> bytes:
+    return b"\0" * (-size % 4)
+
+
+def write_snapshot(file_name: str,
+                   rir_lookup: RirLookup,
+                   country_names: Dict[str, str],
+                   rir_loaded_at: Optional[str] = None) -> int:
+    # 国コード表: 出現順にインデックスを割り当てる
+    cc_list: List[str] = []
+    cc_indexes: Dict[str, int] = {}
+    cc_idx_arr: array = array('H')
+    for cc in rir_lookup.country_codes:
+        idx: Optional[int] = cc_indexes.get(cc)
+        if idx is None:
+            idx = len(cc_list)
+            cc_indexes[cc] = idx
+            cc_list.append(cc)
+        cc_idx_arr.append(idx)
+    # 環境によらず4バイトの配列で出力する
+    ip_starts: array = array('I', rir_lookup.ip_starts)
+    ip_ends: array = array('I', rir_lookup.ip_ends)
+    if sys.byteorder != "little":
+        for arr in (ip_starts, ip_ends, cc_idx_arr):
+            arr.byteswap()
+    cc_bytes: bytes = "".join(cc_list).encode("ascii")
+    idx_bytes: bytes = cc_idx_arr.tobytes()
+    meta: bytes = json.dumps(
+        {"rir_loaded_at": rir_loaded_at, "country_names": country_names}, ensure_ascii=False
+    ).encode("utf-8")
+    # 一時ファイルに出力後に置き換える ※読み込み中のプロセスには影響しない
+    tmp_file: str = f"{file_name}.tmp"
+    with open(tmp_file, "wb") as fp:
+        fp.write(struct.pack(
+            HEADER_FMT, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(cc_list), len(ip_starts), len(meta)
+        ))
+        fp.write(cc_bytes + _padding(len(cc_bytes)))
+        fp.write(ip_starts.tobytes())
+        fp.write(ip_ends.tobytes())
+        fp.write(idx_bytes + _padding(len(idx_bytes)))
+        fp.write(meta)
+    os.replace(tmp_file, file_name)
+    return len(ip_starts)
+
+
+class _CountryCodeView(Sequence[str]):
+    # レコードのインデックスから国コードを返すシーケンス ※RirLookup.country_codes の代替
+    def __init__(self, cc_list: List[str], cc_indexes: memoryview):
+        self.cc_list = cc_list
+        self.cc_indexes = cc_indexes
+
+    def __len__(self) -> int:
+        return len(self.cc_indexes)
+
+    @overload
+    def __getitem__(self, idx: int) -> str: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> List[str]: ...
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(idx, slice):
+            return [self.cc_list[cc_idx] for cc_idx in self.cc_indexes[idx]]
+        return self.cc_list[self.cc_indexes[idx]]
+
+
+class RirSnapshot(RirLookup):
+    # スナップショットファイルをメモリマップして RirLookup と同じ方法で検索する
+    def __init__(self, file_name: str):
+        if sys.byteorder != "little":
+            raise ValueError("RirSnapshot requires little-endian platform.")
+        # メモリマップを参照するビュー ※close() で先に解放する
+        self.views: List[memoryview] = []
+        self.fp = open(file_name, "rb")
+        self.mm: mmap.mmap = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, cc_count, rec_count, meta_size = struct.unpack_from(
+            HEADER_FMT, self.mm, 0
+        )
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"Invalid snapshot file: {file_name}")
+
+        buf: memoryview = memoryview(self.mm)
+        offset: int = HEADER_SIZE
+        cc_size: int = cc_count * 2
+        cc_bytes: bytes = bytes(buf[offset:offset + cc_size])
+        cc_list: List[str] = [
+            cc_bytes[i:i + 2].decode("ascii") for i in range(0, cc_size, 2)
+        ]
+        offset += cc_size + len(_padding(cc_size))
+        # 配列部分はコピーせずにメモリマップを参照する
+        ip_starts: memoryview = buf[offset:offset + rec_count * 4].cast('I')
+        offset += rec_count * 4
+        ip_ends: memoryview = buf[offset:offset + rec_count * 4].cast('I')
+        offset += rec_count * 4
+        idx_size: int = rec_count * 2
+        cc_indexes: memoryview = buf[offset:offset + idx_size].cast('H')
+        offset += idx_size + len(_padding(idx_size))
+        self.views.extend([ip_starts, ip_ends, cc_indexes])
+        self.ip_starts = ip_starts
+        self.ip_ends = ip_ends
+        self.country_codes = _CountryCodeView(cc_list, cc_indexes)
+        meta: Dict[str, Any] = json.loads(bytes(buf[offset:offset + meta_size]).decode("utf-8"))
+        self.rir_loaded_at: Optional[str] = meta["rir_loaded_at"]
+        self.country_names: Dict[str, str] = meta["country_names"]
+
+    def close(self) -> None:
+        # メモリマップを参照するビューを先に解放する
+        for view in self.views:
+            view.release()
+        self.views.clear()
+        self.mm.close()
+        self.fp.close()
+
+    def __enter__(self) -> "RirSnapshot":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
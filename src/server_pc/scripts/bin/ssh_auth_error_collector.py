@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+import argparse
+import fcntl
+import gzip
+import json
+import os
+import re
+import subprocess
+import sys
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+"""
+sshサービスのジャーナルから認証エラーのIPアドレスを前回の続きから収集し、日付ごとのスプールファイルに追記するスクリプト
+journalctl -o json の出力を --after-cursor で前回の最終エントリの次から読み込むため、数分ごとに実行できる
+(利用想定) cron で 10分ごとに実行される
+  ※cronuser は systemd-journal グループに所属していること (sudo 不要)
+
+[出力ファイル] ※OUTPUT_DIR 配下
+  カーソルファイル: journal_cursor.txt (最後に処理したエントリのカーソル)
+  ロックファイル: collector.lock (cron の実行が重なった場合は前の実行の終了を待つ)
+  スプールファイル: AuthFail_ssh_YYYY-mm-dd.spool.gz (1実行ごとに集計したIPアドレスごとの1行を追記)
+    行形式: IPアドレス<TAB>件数<TAB>初回日時(epoch秒)<TAB>最終日時(epoch秒)<TAB>ユーザー名(カンマ区切り)
+    ※同一IPアドレスが複数行になるため --summarize で日付ごとに合算する
+  日次サマリー: AuthFail_ssh_YYYY-mm-dd.summary.tsv.gz (--summarize で前日分のスプールから出力)
+    ヘッダー: ip_addr<TAB>appear_count<TAB>first_seen<TAB>last_seen<TAB>users
+    ※開発PCはログファイルの代わりにこのファイルを scp でコピーして登録する
+
+[テスト] 記録済みのJSONファイルで journalctl を実行せずに確認する
+  TZ=Asia/Tokyo ./ssh_auth_error_collector.py --input ssh_journal_2024-06-23.json --output-dir /tmp/spool
+  ./ssh_auth_error_collector.py --summarize 2024-06-23 --output-dir /tmp/spool
+  ※同じファイルを再実行した場合はカーソル以降のエントリがないため追記しない
+"""
+
+HOME: str = os.environ.get("HOME", "/home/cronuser")
+CMD: str = "/usr/bin/journalctl"
+UNIT: str = "ssh.service"
+OUTPUT_DIR: str = os.path.join(HOME, "work", "journal_spool")
+CURSOR_FILE_NAME: str = "journal_cursor.txt"
+# カーソルファイルとスプールファイルの更新を直列化するロックファイル
+LOCK_FILE_NAME: str = "collector.lock"
+# スプールファイルは gzip のメンバーを実行ごとに追記する (--no-compress 指定時は非圧縮)
+FMT_SPOOL_FILE: str = "AuthFail_ssh_{}.spool"
+GZIP_SUFFIX: str = ".gz"
+FMT_SUMMARY_FILE: str = "AuthFail_ssh_{}.summary.tsv.gz"
+SUMMARY_HEADER: str = "ip_addr\tappear_count\tfirst_seen\tlast_seen\tusers"
+# IPアドレスごとに保持するユーザー名の最大数
+MAX_USERS: int = 20
+
+# 例: pam_unix(sshd:auth): authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost=218.92.0.96  user=root
+re_auth_fail: re.Pattern = re.compile(
+    r"authentication failure;.*?rhost=([0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3})"
+)
+# "ruser=" と区別するため直前が空白の "user=" ※区切り文字を含むユーザー名は除外する
+re_user: re.Pattern = re.compile(r"\suser=([^\s,]+)")
+
+
+@dataclass
+class IpStats:
+    appear_count: int
+    first_seen: int
+    last_seen: int
+    users: Set[str] = field(default_factory=set)
+
+    def add(self, appear_count: int, first_seen: int, last_seen: int, users: Set[str]) -> None:
+        self.appear_count += appear_count
+        self.first_seen = min(self.first_seen, first_seen)
+        self.last_seen = max(self.last_seen, last_seen)
+        for user in users:
+            if len(self.users) >= MAX_USERS:
+                break
+            self.users.add(user)
+
+
+def read_cursor(cursor_file: str) -> Optional[str]:
+    if not os.path.exists(cursor_file):
+        return None
+    with open(cursor_file, "r") as fp:
+        cursor: str = fp.read().strip()
+    return cursor if len(cursor) > 0 else None
+
+
+def save_cursor(cursor_file: str, cursor: str) -> None:
+    # 一時ファイルに出力後に置き換える ※書き込み途中で中断しても前回のカーソルが残る
+    tmp_file: str = f"{cursor_file}.tmp"
+    with open(tmp_file, "w") as fp:
+        fp.write(cursor)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_file, cursor_file)
+
+
+def next_entry_from_journal(cursor: Optional[str], since: str) -> Iterator[Dict[str, Any]]:
+    cmd = [CMD, "-u", UNIT, "-o", "json", "--no-pager"]
+    if cursor is not None:
+        cmd.append(f"--after-cursor={cursor}")
+    else:
+        # 初回はカーソルがないため開始日時を指定する
+        cmd.append(f"--since={since}")
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) as proc:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            yield json.loads(line)
+        if proc.wait() != 0:
+            raise RuntimeError(f"{CMD} exit status: {proc.returncode}")
+
+
+def has_cursor(input_file: str, cursor: Optional[str]) -> bool:
+    with open(input_file, "r") as fp:
+        for line in fp:
+            if json.loads(line).get("__CURSOR") == cursor:
+                return True
+    return False
+
+
+def next_entry_from_file(input_file: str, cursor: Optional[str]) -> Iterator[Dict[str, Any]]:
+    # 記録済みのJSONファイル (journalctl -o json の出力) を読み込む
+    #  ※カーソルが一致するエントリまで読み飛ばす (--after-cursor と同じ動作)
+    skip: bool = cursor is not None
+    if skip and not has_cursor(input_file, cursor):
+        # 前回と異なる記録ファイル: 読み飛ばすと0件で正常終了してしまうため全件を処理する
+        print(f"Warning: cursor not found in {input_file}, read all entries.", file=sys.stderr)
+        skip = False
+    with open(input_file, "r") as fp:
+        for line in fp:
+            entry: Dict[str, Any] = json.loads(line)
+            if skip:
+                skip = entry.get("__CURSOR") != cursor
+                continue
+            yield entry
+
+
+def get_message(entry: Dict[str, Any]) -> Optional[str]:
+    message: Any = entry.get("MESSAGE")
+    if isinstance(message, list):
+        # 表示できない文字を含む場合はバイト値の配列で出力される
+        return bytes(message).decode("utf-8", errors="replace")
+    return message
+
+
+def aggregate(
+        entries: Iterator[Dict[str, Any]]
+        ) -> Tuple[Dict[str, Dict[str, IpStats]], Optional[str], int]:
+    # 戻り値: (日付ごとのIPアドレスの集計, 最終エントリのカーソル, 読み込み件数)
+    day_stats: Dict[str, Dict[str, IpStats]] = {}
+    last_cursor: Optional[str] = None
+    entry_cnt: int = 0
+    for entry in entries:
+        entry_cnt += 1
+        last_cursor = entry.get("__CURSOR", last_cursor)
+        message: Optional[str] = get_message(entry)
+        if message is None:
+            continue
+        mat: Optional[re.Match] = re_auth_fail.search(message)
+        if mat is None:
+            continue
+        # 受信時刻 (マイクロ秒) をローカル日付に変換する
+        seen: int = int(entry["__REALTIME_TIMESTAMP"]) // 1_000_000
+        log_date: str = datetime.fromtimestamp(seen).date().isoformat()
+        ip_stats: Dict[str, IpStats] = day_stats.setdefault(log_date, {})
+        user_mat: Optional[re.Match] = re_user.search(message, mat.end())
+        users: Set[str] = {user_mat.group(1)} if user_mat else set()
+        stats: Optional[IpStats] = ip_stats.get(mat.group(1))
+        if stats is None:
+            ip_stats[mat.group(1)] = IpStats(1, seen, seen, users)
+        else:
+            stats.add(1, seen, seen, users)
+    return day_stats, last_cursor, entry_cnt
+
+
+def get_spool_file(output_dir: str, log_date: str, compress: bool) -> str:
+    spool_file: str = os.path.join(output_dir, FMT_SPOOL_FILE.format(log_date))
+    return spool_file + GZIP_SUFFIX if compress else spool_file
+
+
+def append_spool(output_dir: str, day_stats: Dict[str, Dict[str, IpStats]],
+                 compress: bool = True) -> None:
+    for log_date, ip_stats in day_stats.items():
+        spool_file: str = get_spool_file(output_dir, log_date, compress)
+        lines: str = "".join(
+            f"{ip_addr}\t{stats.appear_count}\t{stats.first_seen}\t{stats.last_seen}"
+            f"\t{','.join(sorted(stats.users))}\n" for ip_addr, stats in ip_stats.items()
+        )
+        with open(spool_file, "ab") as fp:
+            # gzip は追記したメンバーを連結して1つのファイルとして展開できる
+            fp.write(gzip.compress(lines.encode("utf-8")) if compress else lines.encode("utf-8"))
+            fp.flush()
+            os.fsync(fp.fileno())
+        print(f"Appended {spool_file}: {len(ip_stats)} ip")
+
+
+def read_spool(spool_file: str) -> Dict[str, IpStats]:
+    # 実行ごとに追記された行をIPアドレスごとに合算する
+    ip_stats: Dict[str, IpStats] = {}
+    with (gzip.open(spool_file, "rt") if spool_file.endswith(GZIP_SUFFIX)
+          else open(spool_file, "r")) as fp:
+        for line in fp:
+            ip_addr, s_count, s_first, s_last, s_users = line.rstrip("\n").split("\t")
+            users: Set[str] = set(s_users.split(",")) if len(s_users) > 0 else set()
+            stats: Optional[IpStats] = ip_stats.get(ip_addr)
+            if stats is None:
+                stats = IpStats(0, int(s_first), int(s_last))
+                ip_stats[ip_addr] = stats
+            stats.add(int(s_count), int(s_first), int(s_last), users)
+    return ip_stats
+
+
+def to_local_time(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def save_summary(output_dir: str, log_date: str) -> Optional[str]:
+    # 圧縮・非圧縮のスプールファイルが両方ある場合は合算する
+    spool_files: List[str] = [
+        spool_file for spool_file in
+        (get_spool_file(output_dir, log_date, True), get_spool_file(output_dir, log_date, False))
+        if os.path.exists(spool_file)
+    ]
+    if len(spool_files) == 0:
+        return None
+    ip_stats: Dict[str, IpStats] = {}
+    for spool_file in spool_files:
+        for ip_addr, stats in read_spool(spool_file).items():
+            total: Optional[IpStats] = ip_stats.get(ip_addr)
+            if total is None:
+                ip_stats[ip_addr] = stats
+            else:
+                total.add(stats.appear_count, stats.first_seen, stats.last_seen, stats.users)
+    # 件数の多い順 (同数はIPアドレス順)
+    items: List[Tuple[str, IpStats]] = sorted(
+        ip_stats.items(), key=lambda item: (-item[1].appear_count, item[0])
+    )
+    summary_file: str = os.path.join(output_dir, FMT_SUMMARY_FILE.format(log_date))
+    tmp_file: str = f"{summary_file}.tmp"
+    with gzip.open(tmp_file, "wt") as fp:
+        fp.write(f"{SUMMARY_HEADER}\n")
+        for ip_addr, stats in items:
+            fp.write(
+                f"{ip_addr}\t{stats.appear_count}\t{to_local_time(stats.first_seen)}"
+                f"\t{to_local_time(stats.last_seen)}\t{','.join(sorted(stats.users))}\n"
+            )
+    os.replace(tmp_file, summary_file)
+    return summary_file
+
+
+@contextmanager
+def exclusive_lock(output_dir: str) -> Iterator[None]:
+    # ロック解放 (ファイルのクローズ) まで他の実行は待機する
+    with open(os.path.join(output_dir, LOCK_FILE_NAME), "a") as lock_fp:
+        fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_fp.fileno(), fcntl.LOCK_UN)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output-dir", type=str, default=OUTPUT_DIR,
+                        help="Spool and cursor file directory.")
+    # カーソルファイルがない初回の開始日時 (journalctl --since)
+    parser.add_argument("--since", type=str, default="today",
+                        help="Start time without cursor.")
+    # journalctl の代わりに記録済みのJSONファイルを読み込む
+    parser.add_argument("--input", type=str,
+                        help="Recorded journalctl -o json file.")
+    # スプールファイルを圧縮せずに追記する
+    parser.add_argument("--no-compress", action="store_true",
+                        help="Append uncompressed spool file.")
+    # 指定日 (省略時は前日) のスプールファイルから日次サマリーを出力する ※収集は行わない
+    parser.add_argument("--summarize", type=str, nargs="?", const="",
+                        help="Save summary of log date. (default yesterday)")
+    args: argparse.Namespace = parser.parse_args()
+
+    output_dir: str = os.path.expanduser(args.output_dir)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    # cron の実行が重なってもカーソルファイルとスプールファイルの読み書きを直列化する
+    with exclusive_lock(output_dir):
+        collect_main(args, output_dir)
+
+
+def collect_main(args: argparse.Namespace, output_dir: str) -> None:
+    if args.summarize is not None:
+        log_date: str = args.summarize if len(args.summarize) > 0 \
+            else (date.today() - timedelta(days=1)).isoformat()
+        summary_file: Optional[str] = save_summary(output_dir, log_date)
+        if summary_file is None:
+            print(f"Spool file not found: {log_date}")
+        else:
+            print(f"Saved {summary_file}")
+        return
+
+    cursor_file: str = os.path.join(output_dir, CURSOR_FILE_NAME)
+    cursor: Optional[str] = read_cursor(cursor_file)
+    entries: Iterator[Dict[str, Any]]
+    if args.input is not None:
+        entries = next_entry_from_file(args.input, cursor)
+    else:
+        entries = next_entry_from_journal(cursor, args.since)
+
+    day_stats, last_cursor, entry_cnt = aggregate(entries)
+    # スプールファイルに追記してからカーソルを更新する
+    #  ※追記後にカーソル更新前で中断した場合は次回に同じエントリを再集計する
+    append_spool(output_dir, day_stats, compress=not args.no_compress)
+    if last_cursor is not None:
+        save_cursor(cursor_file, last_cursor)
+    print(f"entries: {entry_cnt}, cursor: {last_cursor}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as err:
+        print(err, file=sys.stderr)
+        sys.exit(1)